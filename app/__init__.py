@@ -1,8 +1,12 @@
 from flask import Flask
-from .routes import webhook_bp
+from .config import Config
+from .routes import webhook_bp, process_push_event
+from .services.job_queue import start_workers
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
     app.register_blueprint(webhook_bp)
+    if Config.EMBEDDED_WORKERS:
+        start_workers(handler=process_push_event)
     return app
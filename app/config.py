@@ -10,10 +10,58 @@ class Config:
     GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET", "")
     ALLOW_UNSIGNED_WEBHOOKS = os.getenv("ALLOW_UNSIGNED_WEBHOOKS", "false").lower() == "true"
     GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
+    GITHUB_API_BASE = os.getenv("GITHUB_API_BASE", "https://api.github.com").rstrip("/")
+    # "incremental" fetches only added/modified scripts; "full" re-walks the head tree (bootstrap/resync).
+    SYNC_MODE = os.getenv("SYNC_MODE", "incremental").lower()
+    # "api" reads diffs and contents through the GitHub REST API; "mirror" keeps a bare local
+    # clone per repository and reads them with git (no 300-file compare limit).
+    DIFF_BACKEND = os.getenv("DIFF_BACKEND", "api").lower()
+    GIT_MIRROR_DIR = os.getenv("GIT_MIRROR_DIR", ".cache/mirrors")
+    GIT_MIRROR_URL = os.getenv("GIT_MIRROR_URL", "https://github.com/{owner}/{repo}.git")
+    GIT_FETCH_TIMEOUT = float(os.getenv("GIT_FETCH_TIMEOUT", "600"))
+    GIT_COMMAND_TIMEOUT = float(os.getenv("GIT_COMMAND_TIMEOUT", "60"))
+    # Content-addressed cache of GitHub blobs keyed by blob SHA; empty dir disables it.
+    BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", ".cache/blobs")
+    BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    GITHUB_FETCH_WORKERS = int(os.getenv("GITHUB_FETCH_WORKERS", "8"))
+    GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "3"))
+    GITHUB_BACKOFF_SECONDS = float(os.getenv("GITHUB_BACKOFF_SECONDS", "2"))
+    GITHUB_MAX_BACKOFF_SECONDS = float(os.getenv("GITHUB_MAX_BACKOFF_SECONDS", "60"))
 
     DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "")
     DEEPSEEK_API_BASE = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com")
     DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+    # Streamed completions: separate limits for the first token and for the whole generation.
+    DEEPSEEK_STREAM = os.getenv("DEEPSEEK_STREAM", "true").lower() == "true"
+    DEEPSEEK_CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "10"))
+    DEEPSEEK_FIRST_TOKEN_TIMEOUT = float(os.getenv("DEEPSEEK_FIRST_TOKEN_TIMEOUT", "30"))
+    DEEPSEEK_TOTAL_TIMEOUT = float(os.getenv("DEEPSEEK_TOTAL_TIMEOUT", "180"))
+    # Prompts above the budget are split into AST chunks summarized in parallel, then merged.
+    DEEPSEEK_PROMPT_TOKEN_BUDGET = int(os.getenv("DEEPSEEK_PROMPT_TOKEN_BUDGET", "24000"))
+    DEEPSEEK_CHUNK_TOKENS = int(os.getenv("DEEPSEEK_CHUNK_TOKENS", "8000"))
+    DEEPSEEK_CHUNK_WORKERS = int(os.getenv("DEEPSEEK_CHUNK_WORKERS", "4"))
+    DEEPSEEK_MAX_CHUNKS = int(os.getenv("DEEPSEEK_MAX_CHUNKS", "32"))
+    DEEPSEEK_PATCH_TOKEN_BUDGET = int(os.getenv("DEEPSEEK_PATCH_TOKEN_BUDGET", "5000"))
+    # Small files are documented several per request under a shared token budget.
+    DEEPSEEK_BATCHING = os.getenv("DEEPSEEK_BATCHING", "true").lower() == "true"
+    DEEPSEEK_BATCH_FILE_TOKENS = int(os.getenv("DEEPSEEK_BATCH_FILE_TOKENS", "1500"))
+    DEEPSEEK_BATCH_TOKEN_BUDGET = int(os.getenv("DEEPSEEK_BATCH_TOKEN_BUDGET", "12000"))
+    DEEPSEEK_BATCH_MAX_FILES = int(os.getenv("DEEPSEEK_BATCH_MAX_FILES", "6"))
+    # Modified files whose patch touches at most this share of the source only get the
+    # affected rows/sections of their stored summary revised.
+    DEEPSEEK_INCREMENTAL = os.getenv("DEEPSEEK_INCREMENTAL", "true").lower() == "true"
+    DEEPSEEK_INCREMENTAL_MAX_RATIO = float(os.getenv("DEEPSEEK_INCREMENTAL_MAX_RATIO", "0.3"))
+    # Skip the LLM for scripts whose normalized AST matches the last documented version
+    # (formatter / lint-only pushes). "metadata" refreshes the page with the stored summary,
+    # "skip" leaves it alone.
+    FINGERPRINT_GATE = os.getenv("FINGERPRINT_GATE", "true").lower() == "true"
+    FINGERPRINT_MATCH_ACTION = os.getenv("FINGERPRINT_MATCH_ACTION", "metadata").lower()
+    FINGERPRINT_DOCSTRINGS = os.getenv("FINGERPRINT_DOCSTRINGS", "true").lower() == "true"
+    FINGERPRINT_COMMENTS = os.getenv("FINGERPRINT_COMMENTS", "false").lower() == "true"
+    # Summaries memoized by content hash + model + prompt version; empty path disables it.
+    SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", ".cache/summaries.sqlite3")
+    SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+    SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "10000"))
 
     CONFLUENCE_BASE_URL = os.getenv("CONFLUENCE_BASE_URL", "")
     CONFLUENCE_EMAIL = os.getenv("CONFLUENCE_EMAIL", "")
@@ -21,3 +69,68 @@ class Config:
     CONFLUENCE_SPACE_KEY = os.getenv("CONFLUENCE_SPACE_KEY", "")
     CONFLUENCE_PARENT_PAGE_ID = os.getenv("CONFLUENCE_PARENT_PAGE_ID", "")
     ENABLE_CONFLUENCE = os.getenv("ENABLE_CONFLUENCE", "false").lower() == "true"
+
+    # One pooled keep-alive session per upstream. Idempotent requests are retried on 5xx
+    # and connection errors with exponential backoff.
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+    HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+    GITHUB_HTTP_POOL_SIZE = int(os.getenv("GITHUB_HTTP_POOL_SIZE", "16"))
+    GITHUB_HTTP_TIMEOUT = float(os.getenv("GITHUB_HTTP_TIMEOUT", "30"))
+    DEEPSEEK_HTTP_POOL_SIZE = int(os.getenv("DEEPSEEK_HTTP_POOL_SIZE", "10"))
+    DEEPSEEK_HTTP_TIMEOUT = float(os.getenv("DEEPSEEK_HTTP_TIMEOUT", "60"))
+    CONFLUENCE_HTTP_POOL_SIZE = int(os.getenv("CONFLUENCE_HTTP_POOL_SIZE", "10"))
+    CONFLUENCE_HTTP_TIMEOUT = float(os.getenv("CONFLUENCE_HTTP_TIMEOUT", "30"))
+
+    # Per-upstream token buckets (requests/second, 0 disables) that adapt to Retry-After and
+    # X-RateLimit-* headers, plus circuit breakers that fail fast while an upstream is down.
+    GITHUB_RATE_PER_SECOND = float(os.getenv("GITHUB_RATE_PER_SECOND", "10"))
+    DEEPSEEK_RATE_PER_SECOND = float(os.getenv("DEEPSEEK_RATE_PER_SECOND", "5"))
+    CONFLUENCE_RATE_PER_SECOND = float(os.getenv("CONFLUENCE_RATE_PER_SECOND", "10"))
+    RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "5"))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+    # Per-delivery JSON-lines trace: "stdout", a file path, or empty to disable.
+    TRACE_OUTPUT = os.getenv("TRACE_OUTPUT", "stdout")
+    # cProfile + tracemalloc for every job; costly, meant for investigating slow pushes.
+    TRACE_PROFILE = os.getenv("TRACE_PROFILE", "false").lower() == "true"
+    TRACE_PROFILE_DIR = os.getenv("TRACE_PROFILE_DIR", ".cache/profiles")
+
+    # Scripts of one push are processed in parallel; in-flight calls per upstream are capped.
+    SCRIPT_WORKERS = int(os.getenv("SCRIPT_WORKERS", "8"))
+    DEEPSEEK_CONCURRENCY = int(os.getenv("DEEPSEEK_CONCURRENCY", "4"))
+    CONFLUENCE_CONCURRENCY = int(os.getenv("CONFLUENCE_CONCURRENCY", "4"))
+    # In-memory title -> {id, version} index of script pages, reloaded in bulk after the TTL.
+    CONFLUENCE_INDEX_TTL_SECONDS = float(os.getenv("CONFLUENCE_INDEX_TTL_SECONDS", "300"))
+    CONFLUENCE_INDEX_PAGE_SIZE = int(os.getenv("CONFLUENCE_INDEX_PAGE_SIZE", "200"))
+    # "inline" keeps the full source in the page body; "attachment" uploads scripts of at least
+    # SOURCE_ATTACHMENT_MIN_BYTES as a gzip attachment (only when their blob changed) and shows
+    # an "excerpt", the "diff" or nothing ("none") of at most SOURCE_PREVIEW_LINES lines instead.
+    SOURCE_SNAPSHOT_MODE = os.getenv("SOURCE_SNAPSHOT_MODE", "inline").lower()
+    SOURCE_ATTACHMENT_MIN_BYTES = int(os.getenv("SOURCE_ATTACHMENT_MIN_BYTES", "16384"))
+    SOURCE_PREVIEW = os.getenv("SOURCE_PREVIEW", "excerpt").lower()
+    SOURCE_PREVIEW_LINES = int(os.getenv("SOURCE_PREVIEW_LINES", "40"))
+    # Per-page record of the last written content fingerprint; empty path disables it.
+    PAGE_STATE_PATH = os.getenv("PAGE_STATE_PATH", ".cache/page_state.sqlite3")
+
+    # Durable push processing queue (SQLite). Jobs are retried with exponential backoff and a
+    # running job whose lease expires (worker crash / redeploy) is picked up again.
+    JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", ".cache/jobs.sqlite3")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_QUEUE_MAX_PENDING = int(os.getenv("JOB_QUEUE_MAX_PENDING", "100"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "30"))
+    # Renewed by the running worker every third of the lease; a dead worker's job is free after one lease.
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+    JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+    # With EMBEDDED_WORKERS=false the web process only validates and enqueues; `python worker.py`
+    # runs WORKER_PROCESSES processes, each owning a consistent-hash shard of the repositories.
+    EMBEDDED_WORKERS = os.getenv("EMBEDDED_WORKERS", "true").lower() == "true"
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(os.cpu_count() or 2)))
+    WORKER_SHARD_VNODES = int(os.getenv("WORKER_SHARD_VNODES", "64"))
+    # Shard i serves its own /metrics on WORKER_METRICS_PORT + i; 0 disables the listeners.
+    WORKER_METRICS_HOST = os.getenv("WORKER_METRICS_HOST", "0.0.0.0")
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
@@ -2,64 +2,211 @@ import hashlib
 import hmac
 import json
 import threading
-from flask import Blueprint, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Response, request, jsonify
 
 from app.config import Config
+from app.services import ast_fingerprint, blob_cache, metrics, summary_cache, tracing
 from app.services.github_service import extract_push_context
-from app.services.diff_service import get_repository_python_files
-from app.services.deepseek_service import generate_script_summary
+from app.services.diff_service import iter_repository_python_files
+from app.services.deepseek_service import (
+    generate_batch_summaries,
+    generate_script_summary,
+    is_batchable,
+    plan_batches,
+    usage_stats,
+)
 from app.services.confluence_service import get_script_page, upsert_script_page
+from app.services.job_queue import JobCancelled, QueueFull, enqueue, get_job, queue_depth
+from app.services.page_state import get_page_state
+from app.services.resilience import breaker, raise_if_unavailable
 
 
 webhook_bp = Blueprint("webhook", __name__)
 
 
-def process_push_event(context: dict) -> None:
-    try:
-        repo_scripts = get_repository_python_files(
-            owner=context["owner"],
-            repo=context["repo"],
-            base_sha=context["before"],
-            head_sha=context["after"],
-        )
-
-        if not repo_scripts:
-            print(f"[webhook] no changed python files: {context.get('repo_full_name')}")
-            return
-
-        for file_change in repo_scripts:
-            script_name = file_change.get("script_name", "")
-            status = file_change.get("status", "unchanged")
-            existing_page = get_script_page(script_name)
-
-            if status == "unchanged" and existing_page:
-                print(f"[webhook] script={script_name} deepseek=skipped confluence=already_synced")
-                continue
+def _process_script(file_change: dict, context: dict, should_cancel, summary: str | None = None) -> None:
+    if should_cancel():
+        raise JobCancelled(f"superseded by a newer push: {context.get('repo_full_name')}")
+
+    with tracing.span(
+        "script",
+        script=file_change.get("script_name", ""),
+        path=file_change.get("path", ""),
+        status=file_change.get("status", "unchanged"),
+        content_bytes=len(file_change.get("content", "")),
+    ) as span:
+        try:
+            deepseek, confluence = _sync_script(file_change, context, summary)
+        finally:
+            # Published (or failed): the source is not needed any more, let it be freed.
+            file_change.pop("content", None)
+        if span is not None:
+            span.set(deepseek=deepseek, confluence=confluence)
+
+
+def _sync_script(file_change: dict, context: dict, summary: str | None) -> tuple[str, str]:
+    # Returns the DeepSeek and Confluence outcomes recorded on the script's trace span.
+    script_name = file_change.get("script_name", "")
+    status = file_change.get("status", "unchanged")
+    existing_page = get_script_page(script_name)
+
+    if status == "unchanged" and existing_page:
+        return "skipped", "already_synced"
+
+    if status == "removed":
+        confluence_result = upsert_script_page(summary="", context=context, file_change=file_change)
+        if confluence_result.get("status") == "failed":
+            raise_if_unavailable("confluence")
+        return "skipped", confluence_result.get("status")
+
+    if Config.FINGERPRINT_GATE:
+        _ast_fingerprint(file_change)
+    deepseek = None
+    if summary is None and file_change.get("ast_fingerprint"):
+        matched = _semantically_unchanged(file_change, existing_page)
+        metrics.inc("fingerprint_gate_total", outcome="match" if matched else "miss")
+        if matched and Config.FINGERPRINT_MATCH_ACTION == "skip":
+            return "skipped", "semantically_unchanged"
+        if matched:
+            # Formatting-only change: republish the metadata with the summary already on the page.
+            summary, deepseek = matched["summary"], "reused"
+
+    if summary is None:
+        previous_summary = ""
+        if status == "modified" and existing_page:
+            state = get_page_state(script_name)
+            if state and state["page_id"] == str(existing_page.get("id")):
+                previous_summary = state["summary"]
+        summary = generate_script_summary(file_change=file_change, context=context, previous_summary=previous_summary)
+    deepseek_ok = not summary.startswith("[DeepSeek disabled]") and not summary.startswith("DeepSeek ")
+    if not deepseek_ok:
+        tracing.annotate(deepseek_error=summary[:300])
+        raise_if_unavailable("deepseek")
+
+    if Config.ENABLE_CONFLUENCE and deepseek_ok:
+        confluence_result = upsert_script_page(summary=summary, context=context, file_change=file_change)
+        if confluence_result.get("status") == "failed":
+            raise_if_unavailable("confluence")
+    elif not Config.ENABLE_CONFLUENCE:
+        confluence_result = {"status": "skipped", "reason": "Confluence disabled (set ENABLE_CONFLUENCE=true)"}
+    else:
+        confluence_result = {"status": "skipped", "reason": "DeepSeek summary failed"}
+
+    return deepseek or ("ok" if deepseek_ok else "failed"), confluence_result.get("status")
+
+
+def _process_batch(batch: list[dict], context: dict, should_cancel) -> None:
+    if should_cancel():
+        raise JobCancelled(f"superseded by a newer push: {context.get('repo_full_name')}")
+
+    with tracing.span("batch", files=len(batch)):
+        summaries = generate_batch_summaries(file_changes=batch, context=context)
+        for file_change in batch:
+            _process_script(file_change, context, should_cancel, summary=summaries.get(file_change.get("path")))
+
+
+def _ast_fingerprint(file_change: dict) -> str:
+    # Computed once while the source is still held; upsert_script_page stores it with the page.
+    if "ast_fingerprint" not in file_change:
+        content = file_change.get("content", "")
+        file_change["ast_fingerprint"] = (ast_fingerprint.fingerprint(content) or "") if content else ""
+    return file_change["ast_fingerprint"]
+
+
+def _semantically_unchanged(file_change: dict, existing_page: dict | None) -> dict | None:
+    # Page state of a script whose normalized AST matches the version its summary was written
+    # for, so the summary still holds; None when it has to be (re)generated.
+    if not Config.FINGERPRINT_GATE or file_change.get("status") != "modified" or not existing_page:
+        return None
+    fingerprint = _ast_fingerprint(file_change)
+    if not fingerprint:
+        return None
+    state = get_page_state(file_change.get("script_name", ""))
+    if state and state["page_id"] == str(existing_page.get("id")) and state["ast_fingerprint"] == fingerprint:
+        return state if state["summary"] else None
+    return None
+
 
-            if status == "removed":
-                confluence_result = upsert_script_page(summary="", context=context, file_change=file_change)
-                print(f"[webhook] script={script_name} deepseek=skipped confluence={confluence_result.get('status')}")
+def _needs_summary(file_change: dict) -> bool:
+    status = file_change.get("status")
+    if status == "removed":
+        return False
+    existing_page = get_script_page(file_change.get("script_name", ""))
+    if status == "unchanged" and existing_page:
+        return False
+    return _semantically_unchanged(file_change, existing_page) is None
+
+
+def _raise_failures(in_flight: set) -> None:
+    for future in [future for future in in_flight if future.done()]:
+        in_flight.discard(future)
+        future.result()
+
+
+@metrics.timed("push")
+def process_push_event(context: dict, should_cancel=lambda: False) -> None:
+    # Runs on a job queue worker; exceptions propagate so the queue can retry the delivery.
+    # should_cancel() turns true once a newer push for the same repo has been queued.
+    file_changes = iter_repository_python_files(
+        owner=context["owner"],
+        repo=context["repo"],
+        base_sha=context["before"],
+        head_sha=context["after"],
+        include_unchanged=Config.SYNC_MODE == "full",
+    )
+
+    # Scripts are independent, so they run side by side; DeepSeek and Confluence calls are
+    # additionally capped per upstream inside http_client. Files are pulled from the diff
+    # service only as workers free up, so at most SCRIPT_WORKERS scripts (plus the fetch
+    # lookahead and one open batch) are held in memory at a time.
+    workers = max(1, Config.SCRIPT_WORKERS)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    slots = threading.BoundedSemaphore(workers)
+    in_flight = set()
+
+    def submit(func, *args) -> None:
+        slots.acquire()
+        _raise_failures(in_flight)
+        future = executor.submit(tracing.bind(func), *args, context, should_cancel)
+        future.add_done_callback(lambda _future: slots.release())
+        in_flight.add(future)
+
+    scripts = 0
+    open_batch = []
+    try:
+        for file_change in file_changes:
+            scripts += 1
+            # Small scripts that need a summary share DeepSeek requests; the open batch is
+            # sent once the next file would push it over its budget.
+            if is_batchable(file_change) and _needs_summary(file_change):
+                open_batch.append(file_change)
+                planned = plan_batches(open_batch)
+                if len(planned) > 1:
+                    full = planned[0]
+                    open_batch = [fc for batch in planned[1:] for fc in batch]
+                    if len(full) > 1:
+                        submit(_process_batch, full)
+                    else:
+                        submit(_process_script, full[0])
                 continue
+            submit(_process_script, file_change)
 
-            summary = generate_script_summary(file_change=file_change, context=context)
-            deepseek_ok = not summary.startswith("[DeepSeek disabled]") and not summary.startswith("DeepSeek ")
-            if not deepseek_ok:
-                print(f"[webhook] script={script_name} deepseek_error={summary[:300]}")
+        if len(open_batch) > 1:
+            submit(_process_batch, open_batch)
+        elif open_batch:
+            submit(_process_script, open_batch[0])
+        open_batch = []
 
-            if Config.ENABLE_CONFLUENCE and deepseek_ok:
-                confluence_result = upsert_script_page(summary=summary, context=context, file_change=file_change)
-            elif not Config.ENABLE_CONFLUENCE:
-                confluence_result = {"status": "skipped", "reason": "Confluence disabled (set ENABLE_CONFLUENCE=true)"}
-            else:
-                confluence_result = {"status": "skipped", "reason": "DeepSeek summary failed"}
+        for future in list(in_flight):
+            future.result()
+    finally:
+        file_changes.close()
+        executor.shutdown(wait=True, cancel_futures=True)
 
-            print(
-                f"[webhook] script={script_name} "
-                f"deepseek={'ok' if deepseek_ok else 'failed'} "
-                f"confluence={confluence_result.get('status')}"
-            )
-    except Exception as exc:
-        print(f"[webhook] processing error: {exc}")
+    if not scripts:
+        tracing.event("no_python_changes", repo=context.get("repo_full_name"))
+    tracing.annotate(scripts=scripts)
 
 
 def is_valid_signature(raw_body: bytes, signature_header: str) -> bool:
@@ -109,7 +256,48 @@ def parse_github_payload(raw_body: bytes) -> dict | None:
 
 @webhook_bp.get("/health")
 def health_check():
-    return jsonify({"status": "ok"})
+    return jsonify(
+        {
+            "status": "ok",
+            "blob_cache": blob_cache.cache_stats(),
+            "summary_cache": summary_cache.cache_stats(),
+        }
+    )
+
+
+def metric_samples() -> list[tuple[str, dict, float]]:
+    samples = []
+    depth = queue_depth()
+    for status in ("queued", "running", "succeeded", "failed", "cancelled", "superseded"):
+        samples.append(("queue_jobs", {"status": status}, depth.get(status, 0)))
+
+    # Each metric family is written as one block: metrics outside, caches inside.
+    caches = (("blob", blob_cache.cache_stats()), ("summary", summary_cache.cache_stats()))
+    for metric, field in (
+        ("cache_hits_total", "hits"),
+        ("cache_misses_total", "misses"),
+        ("cache_hit_ratio", "hit_rate"),
+        ("cache_evictions_total", "evictions"),
+    ):
+        for name, stats in caches:
+            samples.append((metric, {"cache": name}, stats[field]))
+
+    usage = usage_stats()
+    samples.append(("deepseek_requests_total", {}, usage["requests"]))
+    samples.append(("deepseek_tokens_total", {"kind": "prompt"}, usage["prompt_tokens"]))
+    samples.append(("deepseek_tokens_total", {"kind": "completion"}, usage["completion_tokens"]))
+    samples.append(("deepseek_partial_results_total", {}, usage["partial_results"]))
+    samples.append(("deepseek_timeouts_total", {"deadline": "first_token"}, usage["first_token_timeouts"]))
+    samples.append(("deepseek_timeouts_total", {"deadline": "total"}, usage["total_timeouts"]))
+
+    for upstream in ("github", "deepseek", "confluence"):
+        samples.append(("circuit_open", {"upstream": upstream}, int(breaker(upstream).is_open())))
+    return samples
+
+
+@webhook_bp.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(metric_samples()), mimetype="text/plain; version=0.0.4")
 
 
 @webhook_bp.post("/webhook/github")
@@ -137,15 +325,28 @@ def github_webhook():
     if not context["before"] or not context["after"]:
         return jsonify({"message": "ignored: missing commit range"}), 200
 
-    worker = threading.Thread(target=process_push_event, args=(context,), daemon=True)
-    worker.start()
+    try:
+        job = enqueue(delivery_id, context)
+    except QueueFull as exc:
+        response = jsonify({"error": "queue full", "detail": str(exc)})
+        response.headers["Retry-After"] = "60"
+        return response, 503
 
     return jsonify(
         {
             "message": "accepted",
-            "delivery_id": delivery_id,
+            "delivery_id": job["delivery_id"],
             "repo": context["repo_full_name"],
             "base": context["before"],
             "head": context["after"],
+            "job_status": job["status"],
         }
     ), 202
+
+
+@webhook_bp.get("/jobs/<delivery_id>")
+def job_status(delivery_id: str):
+    job = get_job(delivery_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job)
@@ -0,0 +1,77 @@
+import ast
+import hashlib
+import inspect
+import io
+import tokenize
+
+from app.config import Config
+
+
+# Bump when the normalization changes so stored fingerprints stop matching.
+FINGERPRINT_VERSION = "1"
+
+_IMPORTS = (ast.Import, ast.ImportFrom)
+_SCOPES = (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+def _is_docstring(node: ast.stmt) -> bool:
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+
+def _import_key(node: ast.stmt) -> str:
+    return ast.dump(node, annotate_fields=False)
+
+
+def _sort_import_runs(body: list[ast.stmt]) -> list[ast.stmt]:
+    # Only adjacent imports are reordered; moving an import past other code can change behavior.
+    result, run = [], []
+    for node in body + [None]:
+        if isinstance(node, _IMPORTS):
+            node.names.sort(key=lambda alias: (alias.name, alias.asname or ""))
+            run.append(node)
+            continue
+        result.extend(sorted(run, key=_import_key))
+        run = []
+        if node is not None:
+            result.append(node)
+    return result
+
+
+def _normalize(tree: ast.Module, keep_docstrings: bool) -> ast.Module:
+    for node in ast.walk(tree):
+        if not isinstance(node, _SCOPES) or not node.body:
+            continue
+        body = node.body
+        if _is_docstring(body[0]):
+            if keep_docstrings:
+                # Formatters re-indent docstrings; only their text matters.
+                body[0].value.value = inspect.cleandoc(body[0].value.value)
+            else:
+                body = body[1:] or [ast.Pass()]
+        node.body = _sort_import_runs(body)
+    return tree
+
+
+def _comments(content: str) -> list[str]:
+    try:
+        tokens = tokenize.generate_tokens(io.StringIO(content).readline)
+        return [token.string.lstrip("#").strip() for token in tokens if token.type == tokenize.COMMENT]
+    except (tokenize.TokenError, SyntaxError):
+        return []
+
+
+def fingerprint(content: str) -> str | None:
+    # Hash of the normalized AST: formatting, comments (unless FINGERPRINT_COMMENTS) and the
+    # order of adjacent imports do not affect it. None when the file does not parse.
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+
+    keep_docstrings = Config.FINGERPRINT_DOCSTRINGS
+    digest = hashlib.sha256()
+    digest.update(f"v{FINGERPRINT_VERSION}:{int(keep_docstrings)}:{int(Config.FINGERPRINT_COMMENTS)}\n".encode())
+    digest.update(ast.dump(_normalize(tree, keep_docstrings), annotate_fields=False).encode("utf-8"))
+    if Config.FINGERPRINT_COMMENTS:
+        digest.update("\n".join(_comments(content)).encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+
+from app.config import Config
+
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_state = {"bytes": None}
+
+
+def _enabled() -> bool:
+    return bool(Config.BLOB_CACHE_DIR)
+
+
+def _blob_path(sha: str) -> str:
+    # Fan out on the first two hex chars like .git/objects so no directory gets huge.
+    return os.path.join(Config.BLOB_CACHE_DIR, sha[:2], sha)
+
+
+def _scan() -> list[tuple[float, int, str]]:
+    entries = []
+    for root, _dirs, files in os.walk(Config.BLOB_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _evict_if_needed() -> None:
+    if _state["bytes"] is None:
+        _state["bytes"] = sum(size for _mtime, size, _path in _scan())
+    if _state["bytes"] <= Config.BLOB_CACHE_MAX_BYTES:
+        return
+
+    # Rescan so other processes sharing the directory are accounted for, then drop
+    # least recently used blobs (mtime is bumped on every hit) down to 90% of the limit.
+    entries = sorted(_scan())
+    total = sum(size for _mtime, size, _path in entries)
+    target = int(Config.BLOB_CACHE_MAX_BYTES * 0.9)
+    for _mtime, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        _stats["evictions"] += 1
+    _state["bytes"] = total
+
+
+def get_blob(sha: str) -> bytes | None:
+    if not _enabled() or not sha:
+        return None
+
+    path = _blob_path(sha)
+    try:
+        with open(path, "rb") as handle:
+            data = handle.read()
+    except OSError:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    with _lock:
+        _stats["hits"] += 1
+    return data
+
+
+def put_blob(sha: str, data: bytes) -> None:
+    if not _enabled() or not sha:
+        return
+
+    path = _blob_path(sha)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        return
+
+    with _lock:
+        _stats["writes"] += 1
+        if _state["bytes"] is not None:
+            _state["bytes"] += len(data)
+        _evict_if_needed()
+
+
+def cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["bytes"] = _state["bytes"]
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["enabled"] = _enabled()
+    return stats
@@ -1,30 +1,42 @@
 import base64
 import datetime as dt
+import functools
+import gzip
+import hashlib
 import html
+import posixpath
+import threading
+import time
 import requests
 
 from app.config import Config
+from app.services import http_client, metrics
+from app.services.page_state import delete_page_state, get_page_state, save_page_state
 
 
-def _auth_headers() -> dict:
-    auth_token = base64.b64encode(
-        f"{Config.CONFLUENCE_EMAIL}:{Config.CONFLUENCE_API_TOKEN}".encode("utf-8")
-    ).decode("utf-8")
+@functools.lru_cache(maxsize=4)
+def _basic_auth_headers(email: str, api_token: str) -> dict:
+    auth_token = base64.b64encode(f"{email}:{api_token}".encode("utf-8")).decode("utf-8")
     return {
         "Authorization": f"Basic {auth_token}",
         "Content-Type": "application/json",
     }
 
 
+def _auth_headers() -> dict:
+    return dict(_basic_auth_headers(Config.CONFLUENCE_EMAIL, Config.CONFLUENCE_API_TOKEN))
+
+
+@metrics.timed("confluence_lookup")
 def _find_existing_page(title: str, headers: dict) -> dict | None:
     url = f"{Config.CONFLUENCE_BASE_URL}/rest/api/content"
     params = {
         "title": title,
         "spaceKey": Config.CONFLUENCE_SPACE_KEY,
-        "expand": "space",
+        "expand": "space,version",
     }
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        response = http_client.request("confluence", "GET", url, headers=headers, params=params)
     except requests.RequestException:
         return None
 
@@ -38,36 +50,166 @@ def _find_existing_page(title: str, headers: dict) -> dict | None:
     return results[0]
 
 
-def _build_page_body(summary_html: str, context: dict, file_change: dict) -> str:
-    timestamp = dt.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
-    safe_code = html.escape(file_change.get("content", ""))
-    safe_change_type = html.escape(file_change.get("status", "unknown"))
+_index_lock = threading.Lock()
+_page_index = {"pages": None, "loaded_at": 0.0}
+
+
+def _index_entry(page: dict) -> dict:
+    return {
+        "id": str(page.get("id", "")),
+        "title": page.get("title", ""),
+        "version": {"number": page.get("version", {}).get("number", 1)},
+    }
+
+
+@metrics.timed("confluence_index_load")
+def _load_page_index(headers: dict) -> dict | None:
+    # Script pages are created under the parent page when one is configured, otherwise
+    # anywhere in the space; list that scope in bulk instead of one title search per script.
+    if Config.CONFLUENCE_PARENT_PAGE_ID:
+        url = f"{Config.CONFLUENCE_BASE_URL}/rest/api/content/{Config.CONFLUENCE_PARENT_PAGE_ID}/child/page"
+        params = {"expand": "version"}
+    else:
+        url = f"{Config.CONFLUENCE_BASE_URL}/rest/api/content"
+        params = {"spaceKey": Config.CONFLUENCE_SPACE_KEY, "type": "page", "expand": "version"}
+
+    limit = Config.CONFLUENCE_INDEX_PAGE_SIZE
+    pages = {}
+    start = 0
+    while True:
+        try:
+            response = http_client.request(
+                "confluence", "GET", url, headers=headers, params={**params, "start": start, "limit": limit}
+            )
+        except requests.RequestException:
+            return None
+
+        if response.status_code != 200:
+            return None
+
+        data = response.json()
+        results = data.get("results", [])
+        for page in results:
+            pages[page.get("title", "")] = _index_entry(page)
+
+        if not results or not data.get("_links", {}).get("next"):
+            return pages
+        start += len(results)
+
+
+def _lookup_page(title: str, headers: dict) -> dict | None:
+    with _index_lock:
+        expired = time.time() - _page_index["loaded_at"] > Config.CONFLUENCE_INDEX_TTL_SECONDS
+        if _page_index["pages"] is None or expired:
+            pages = _load_page_index(headers)
+            if pages is not None:
+                _page_index["pages"] = pages
+                _page_index["loaded_at"] = time.time()
+        pages = _page_index["pages"]
+
+    if pages is None:
+        return _find_existing_page(title=title, headers=headers)
+    return pages.get(title)
+
+
+def _index_set(page: dict) -> None:
+    with _index_lock:
+        if _page_index["pages"] is not None:
+            _page_index["pages"][page["title"]] = page
+
+
+def _index_remove(title: str) -> None:
+    with _index_lock:
+        if _page_index["pages"] is not None:
+            _page_index["pages"].pop(title, None)
+
+
+def _attachment_name(file_change: dict) -> str | None:
+    # Scripts whose source is uploaded as an attachment instead of inlined in every page version.
+    if Config.SOURCE_SNAPSHOT_MODE != "attachment":
+        return None
+    if len(file_change.get("content", "").encode("utf-8")) < Config.SOURCE_ATTACHMENT_MIN_BYTES:
+        return None
+    return f"{posixpath.basename(file_change.get('path', '')) or 'source.py'}.gz"
+
+
+def _source_sha(file_change: dict) -> str:
+    if file_change.get("sha"):
+        return file_change["sha"]
+    data = file_change.get("content", "").encode("utf-8")
+    return hashlib.sha1(f"blob {len(data)}\0".encode("ascii") + data).hexdigest()
+
+
+def _source_preview(file_change: dict, include_volatile: bool) -> str:
+    limit = Config.SOURCE_PREVIEW_LINES
+    preview = Config.SOURCE_PREVIEW
+    if preview == "none" or limit <= 0:
+        return ""
+    if preview == "diff" and file_change.get("patch"):
+        # The diff depends on the commit range, so like the range itself it stays out of the fingerprint.
+        if not include_volatile:
+            return ""
+        label, lines = "Latest Change", file_change["patch"].splitlines()
+    else:
+        label, lines = "Excerpt", file_change.get("content", "").splitlines()
+    hidden = len(lines) - limit
+    note = f"<p><em>{hidden} more lines not shown.</em></p>" if hidden > 0 else ""
+    return f"<p><strong>{label}</strong></p><pre>{html.escape(chr(10).join(lines[:limit]))}</pre>{note}"
+
+
+def _build_page_body(summary_html: str, context: dict, file_change: dict, include_volatile: bool = True) -> str:
     safe_file_path = html.escape(file_change.get("path", ""))
     safe_repo = html.escape(context.get("repo_full_name", ""))
     safe_ref = html.escape(context.get("ref", ""))
-    safe_base = html.escape(context.get("before", ""))
-    safe_head = html.escape(context.get("after", ""))
 
     if not summary_html.strip().startswith("<"):
         summary_html = f"<p>{html.escape(summary_html)}</p>"
 
+    # Commit range, change type and timestamp differ on every push even when the
+    # documented content is identical, so the fingerprint render leaves them out.
+    volatile_rows = ""
+    if include_volatile:
+        timestamp = dt.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+        safe_change_type = html.escape(file_change.get("status", "unknown"))
+        safe_base = html.escape(context.get("before", ""))
+        safe_head = html.escape(context.get("after", ""))
+        volatile_rows = (
+            f"<tr><th><strong>Commit Range</strong></th><td><code>{safe_base}</code> → <code>{safe_head}</code></td></tr>"
+            f"<tr><th><strong>Change Type</strong></th><td>{safe_change_type}</td></tr>"
+            f"<tr><th><strong>Last Updated</strong></th><td>{timestamp}</td></tr>"
+        )
+
+    attachment = _attachment_name(file_change)
+    if attachment:
+        source_html = (
+            f'<p><ac:link><ri:attachment ri:filename="{html.escape(attachment)}" /></ac:link> '
+            f"(gzip, blob <code>{html.escape(_source_sha(file_change))}</code>)</p>"
+            f"{_source_preview(file_change, include_volatile)}"
+        )
+    else:
+        source_html = f"<pre>{html.escape(file_change.get('content', ''))}</pre>"
+
     return (
         "<h2><strong>📘 Script Documentation</strong></h2>"
         "<table><tbody>"
         f"<tr><th><strong>Repository</strong></th><td>{safe_repo}</td></tr>"
         f"<tr><th><strong>Script Path</strong></th><td><code>{safe_file_path}</code></td></tr>"
         f"<tr><th><strong>Branch</strong></th><td>{safe_ref}</td></tr>"
-        f"<tr><th><strong>Commit Range</strong></th><td><code>{safe_base}</code> → <code>{safe_head}</code></td></tr>"
-        f"<tr><th><strong>Change Type</strong></th><td>{safe_change_type}</td></tr>"
-        f"<tr><th><strong>Last Updated</strong></th><td>{timestamp}</td></tr>"
+        f"{volatile_rows}"
         "</tbody></table>"
         "<h2><strong>🧠 AI Technical Summary</strong></h2>"
         f"{summary_html}"
         "<h2><strong>💻 Current Source Snapshot</strong></h2>"
-        f"<pre>{safe_code}</pre>"
+        f"{source_html}"
     )
 
 
+def _page_fingerprint(summary_html: str, context: dict, file_change: dict) -> str:
+    body = _build_page_body(summary_html=summary_html, context=context, file_change=file_change, include_volatile=False)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+@metrics.timed("confluence_create")
 def _create_page(title: str, body: str, headers: dict) -> dict:
     url = f"{Config.CONFLUENCE_BASE_URL}/rest/api/content"
     payload = {
@@ -85,7 +227,11 @@ def _create_page(title: str, body: str, headers: dict) -> dict:
     if Config.CONFLUENCE_PARENT_PAGE_ID:
         payload["ancestors"] = [{"id": str(Config.CONFLUENCE_PARENT_PAGE_ID)}]
 
-    response = requests.post(url, headers=headers, json=payload, timeout=30)
+    try:
+        response = http_client.request("confluence", "POST", url, headers=headers, json=payload)
+    except requests.RequestException as exc:
+        return {"status": "failed", "reason": f"create error: {exc}"}
+
     if response.status_code not in (200, 201):
         return {
             "status": "failed",
@@ -93,53 +239,90 @@ def _create_page(title: str, body: str, headers: dict) -> dict:
             "body": response.text,
         }
     data = response.json()
+    _index_set(_index_entry(data))
     return {"status": "published", "page_id": data.get("id"), "title": data.get("title")}
 
 
-def _update_page(existing: dict, title: str, body: str, headers: dict) -> dict:
-    page_id = existing.get("id")
-    if not page_id:
-        return {"status": "failed", "reason": "existing page id missing"}
-
+def _fetch_page_version(page_id: str, headers: dict) -> tuple[int | None, dict]:
     get_url = f"{Config.CONFLUENCE_BASE_URL}/rest/api/content/{page_id}"
     params = {"expand": "version"}
     try:
-        get_response = requests.get(get_url, headers=headers, params=params, timeout=30)
+        get_response = http_client.request("confluence", "GET", get_url, headers=headers, params=params)
     except requests.RequestException as exc:
-        return {"status": "failed", "reason": f"version fetch error: {exc}"}
+        return None, {"status": "failed", "reason": f"version fetch error: {exc}"}
 
     if get_response.status_code != 200:
-        return {"status": "failed", "status_code": get_response.status_code, "body": get_response.text}
+        return None, {"status": "failed", "status_code": get_response.status_code, "body": get_response.text}
 
     page_data = get_response.json()
-    current_version = page_data.get("version", {}).get("number", 1)
+    return page_data.get("version", {}).get("number", 1), {}
 
-    update_payload = {
-        "id": str(page_id),
-        "type": "page",
-        "title": title,
-        "space": {"key": Config.CONFLUENCE_SPACE_KEY},
-        "version": {"number": current_version + 1},
-        "body": {
-            "storage": {
-                "value": body,
-                "representation": "storage",
-            }
-        },
-    }
 
-    update_url = f"{Config.CONFLUENCE_BASE_URL}/rest/api/content/{page_id}"
-    try:
-        update_response = requests.put(update_url, headers=headers, json=update_payload, timeout=30)
-    except requests.RequestException as exc:
-        return {"status": "failed", "reason": f"update error: {exc}"}
+@metrics.timed("confluence_update")
+def _update_page(existing: dict, title: str, body: str, headers: dict) -> dict:
+    page_id = existing.get("id")
+    if not page_id:
+        return {"status": "failed", "reason": "existing page id missing"}
+
+    # Index entries carry the version, which saves a GET; a 409 means someone else
+    # edited the page since the index was loaded, so refetch the version and retry once.
+    current_version = existing.get("version", {}).get("number")
+    for attempt in range(2):
+        if current_version is None or attempt:
+            current_version, error = _fetch_page_version(page_id, headers)
+            if current_version is None:
+                return error
+
+        update_payload = {
+            "id": str(page_id),
+            "type": "page",
+            "title": title,
+            "space": {"key": Config.CONFLUENCE_SPACE_KEY},
+            "version": {"number": current_version + 1},
+            "body": {
+                "storage": {
+                    "value": body,
+                    "representation": "storage",
+                }
+            },
+        }
+
+        update_url = f"{Config.CONFLUENCE_BASE_URL}/rest/api/content/{page_id}"
+        try:
+            update_response = http_client.request("confluence", "PUT", update_url, headers=headers, json=update_payload)
+        except requests.RequestException as exc:
+            return {"status": "failed", "reason": f"update error: {exc}"}
+
+        if update_response.status_code != 409:
+            break
 
     if update_response.status_code != 200:
         return {"status": "failed", "status_code": update_response.status_code, "body": update_response.text}
 
+    _index_set({"id": str(page_id), "title": title, "version": {"number": current_version + 1}})
     return {"status": "updated", "page_id": page_id, "title": title}
 
 
+@metrics.timed("confluence_attachment")
+def _upload_source_attachment(page_id: str, file_change: dict, headers: dict) -> dict:
+    # PUT creates the attachment, or adds a version to the page's attachment with that name.
+    url = f"{Config.CONFLUENCE_BASE_URL}/rest/api/content/{page_id}/child/attachment"
+    data = gzip.compress(file_change.get("content", "").encode("utf-8"), mtime=0)
+    upload_headers = {key: value for key, value in headers.items() if key != "Content-Type"}
+    upload_headers["X-Atlassian-Token"] = "no-check"
+    files = {"file": (_attachment_name(file_change), data, "application/gzip")}
+    form = {"comment": f"blob {_source_sha(file_change)}", "minorEdit": "true"}
+    try:
+        response = http_client.request("confluence", "PUT", url, headers=upload_headers, files=files, data=form)
+    except requests.RequestException as exc:
+        return {"status": "failed", "reason": f"attachment error: {exc}"}
+
+    if response.status_code not in (200, 201):
+        return {"status": "failed", "status_code": response.status_code, "body": response.text}
+    return {"status": "uploaded", "bytes": len(data)}
+
+
+@metrics.timed("confluence_delete")
 def _delete_page(existing: dict, headers: dict) -> dict:
     page_id = existing.get("id")
     if not page_id:
@@ -148,20 +331,28 @@ def _delete_page(existing: dict, headers: dict) -> dict:
     delete_url = f"{Config.CONFLUENCE_BASE_URL}/rest/api/content/{page_id}"
     params = {"status": "current"}
     try:
-        delete_response = requests.delete(delete_url, headers=headers, params=params, timeout=30)
+        delete_response = http_client.request("confluence", "DELETE", delete_url, headers=headers, params=params)
     except requests.RequestException as exc:
         return {"status": "failed", "reason": f"delete error: {exc}"}
 
     if delete_response.status_code not in (200, 204):
         return {"status": "failed", "status_code": delete_response.status_code, "body": delete_response.text}
 
+    _index_remove(existing.get("title", ""))
     return {"status": "deleted", "page_id": page_id, "title": existing.get("title")}
 
 
+def _find_outside_index(title: str, headers: dict) -> dict | None:
+    existing = _find_existing_page(title=title, headers=headers)
+    if existing:
+        _index_set(_index_entry(existing))
+    return existing
+
+
 def get_script_page(script_name: str) -> dict | None:
     if not (Config.CONFLUENCE_BASE_URL and Config.CONFLUENCE_EMAIL and Config.CONFLUENCE_API_TOKEN and Config.CONFLUENCE_SPACE_KEY):
         return None
-    return _find_existing_page(title=script_name, headers=_auth_headers())
+    return _lookup_page(title=script_name, headers=_auth_headers())
 
 
 def upsert_script_page(summary: str, context: dict, file_change: dict) -> dict:
@@ -170,15 +361,65 @@ def upsert_script_page(summary: str, context: dict, file_change: dict) -> dict:
 
     title = file_change.get("script_name", "script")
     headers = _auth_headers()
-    existing = _find_existing_page(title=title, headers=headers)
+    existing = _lookup_page(title=title, headers=headers)
+    if not existing and Config.CONFLUENCE_PARENT_PAGE_ID:
+        # Titles are unique per space but the index only covers the parent page: check the
+        # rest of the space before creating (a create would be rejected as a duplicate) or
+        # giving up on a delete. A space-wide index miss already means there is no page.
+        existing = _find_outside_index(title=title, headers=headers)
 
     if file_change.get("status") == "removed":
         if not existing:
             return {"status": "skipped", "reason": "page not found for removed script"}
-        return _delete_page(existing=existing, headers=headers)
+        result = _delete_page(existing=existing, headers=headers)
+        if result.get("status") == "deleted":
+            delete_page_state(title)
+        return result
+
+    fingerprint = _page_fingerprint(summary_html=summary, context=context, file_change=file_change)
+    state = get_page_state(title) if existing else None
+    if state and state["page_id"] != str(existing.get("id")):
+        state = None
+    if state and state["fingerprint"] == fingerprint:
+        ast_fingerprint = file_change.get("ast_fingerprint", "")
+        if ast_fingerprint and state["ast_fingerprint"] != ast_fingerprint:
+            # Pages documented before the AST gate existed pick up their fingerprint here.
+            save_page_state(
+                title, state["page_id"], fingerprint, state["summary"], ast_fingerprint, state["source_sha"]
+            )
+        return {"status": "unchanged", "page_id": existing.get("id"), "title": title}
+
+    # The attachment is only re-uploaded when the blob changed. Existing pages get it before
+    # the update so the new body never links to a missing file; new pages need their id first.
+    source_sha = _source_sha(file_change) if _attachment_name(file_change) else ""
+    upload_needed = bool(source_sha) and source_sha != (state["source_sha"] if state else "")
+    if existing and upload_needed:
+        upload = _upload_source_attachment(existing.get("id"), file_change, headers)
+        if upload.get("status") == "failed":
+            return upload
 
     body = _build_page_body(summary_html=summary, context=context, file_change=file_change)
     if existing:
-        return _update_page(existing=existing, title=title, body=body, headers=headers)
-
-    return _create_page(title=title, body=body, headers=headers)
+        result = _update_page(existing=existing, title=title, body=body, headers=headers)
+    else:
+        result = _create_page(title=title, body=body, headers=headers)
+        if result.get("status_code") == 400 and not Config.CONFLUENCE_PARENT_PAGE_ID:
+            # Another worker created the page after our index was loaded; update it instead.
+            if _find_outside_index(title=title, headers=headers):
+                return upsert_script_page(summary=summary, context=context, file_change=file_change)
+        if result.get("status") == "published" and upload_needed:
+            upload = _upload_source_attachment(result.get("page_id"), file_change, headers)
+            if upload.get("status") == "failed":
+                # No page state is saved, so the next push re-renders the page and retries.
+                return {**upload, "page_id": result.get("page_id"), "title": title}
+
+    if result.get("status") in ("published", "updated"):
+        save_page_state(
+            title,
+            page_id=result.get("page_id"),
+            fingerprint=fingerprint,
+            summary=summary,
+            ast_fingerprint=file_change.get("ast_fingerprint", ""),
+            source_sha=source_sha,
+        )
+    return result
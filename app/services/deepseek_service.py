@@ -1,44 +1,61 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from app.config import Config
+from app.services import http_client, incremental_summary, metrics, prompt_builder, summary_cache, tracing
 
 
-def generate_script_summary(file_change: dict, context: dict) -> str:
-    if not Config.DEEPSEEK_API_KEY:
-        return "[DeepSeek disabled] Set DEEPSEEK_API_KEY to generate AI summary."
+_BATCH_SECTION_RE = re.compile(r"<!--\s*FILE:\s*(.+?)\s*-->(.*?)<!--\s*END FILE\s*-->", re.DOTALL)
 
-    is_new_file = file_change.get("status") == "added"
-    is_bootstrap = file_change.get("status") == "unchanged"
-    action_text = "new script added" if is_new_file else "existing script updated"
-    if is_bootstrap:
-        action_text = "script documentation sync"
-    prompt = (
-        "You are generating enterprise engineering documentation for Confluence.\n"
-        "Return ONLY valid HTML snippet (no markdown fences) using these tags only: "
-        "h3, h4, p, ul, li, table, thead, tbody, tr, th, td, code, strong.\n"
-        "Use this structure:\n"
-        "- <h3>Purpose</h3>\n"
-        "- <h3>High-Level Flow</h3>\n"
-        "- <h3>Functions and Return Values</h3> as an HTML table with columns: Function, Inputs, Return Value, Notes\n"
-        "- <h3>Input/Output Behavior</h3>\n"
-        "- <h3>Error Handling and Edge Cases</h3>\n"
-        "- <h3>Recent Change Summary</h3>\n"
-        "- <h3>Risks / Follow-ups</h3>\n"
-        "Be concrete and technical. Mention exact function names and return behavior.\n\n"
-        f"Repository: {context.get('repo_full_name')}\n"
-        f"Branch: {context.get('ref')}\n"
-        f"Commit Range: {context.get('before')} -> {context.get('after')}\n\n"
-        f"File Path: {file_change.get('path')}\n"
-        f"Change Type: {action_text}\n\n"
-        f"Current File Content:\n{file_change.get('content', '')[:120000]}\n\n"
-        f"Patch (if available):\n{file_change.get('patch', '')[:20000]}"
-    )
+_PARTIAL_NOTE = "<p><strong>Note:</strong> generation stopped early; later sections are missing.</p>"
+_TRUNCATED_NOTE = "<p><strong>Note:</strong> only the first {covered} of {total} parts of this file were documented.</p>"
 
-    url = f"{Config.DEEPSEEK_API_BASE}/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {Config.DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json",
-    }
-    payload = {
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+    "partial_results": 0,
+    "first_token_timeouts": 0,
+    "total_timeouts": 0,
+}
+
+
+def _is_error(text: str) -> bool:
+    return text.startswith("DeepSeek ")
+
+
+def _record(prompt_tokens: int = 0, completion_tokens: int = 0, **flags: int) -> None:
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["prompt_tokens"] += prompt_tokens
+        _stats["completion_tokens"] += completion_tokens
+        for name, amount in flags.items():
+            _stats[name] += amount
+
+
+def usage_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _salvage_partial(text: str) -> str:
+    # Keep what was generated before the stream stopped, cut back to the last complete
+    # section (HTML summaries) or line (plain-text chunk notes). Empty means unusable.
+    if "<h3>" in text:
+        cut = text.rfind("<h3>")
+        kept = text[:cut].rstrip()
+        if "<h3>" not in kept:
+            return ""
+        return kept + _PARTIAL_NOTE
+    return text[: text.rfind("\n")].rstrip() if "\n" in text else ""
+
+
+def _request_payload(prompt: str) -> dict:
+    return {
         "model": Config.DEEPSEEK_MODEL,
         "messages": [
             {"role": "system", "content": "You are a precise software documentation assistant."},
@@ -47,17 +64,299 @@ def generate_script_summary(file_change: dict, context: dict) -> str:
         "temperature": 0.2,
     }
 
+
+def _blocking_completion(url: str, headers: dict, payload: dict) -> tuple[str, bool]:
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=60)
+        response = http_client.request("deepseek", "POST", url, json=payload, headers=headers)
     except requests.RequestException as exc:
-        return f"DeepSeek network error: {exc}"
+        return f"DeepSeek network error: {exc}", False
 
     if response.status_code != 200:
-        return f"DeepSeek request failed: {response.status_code} {response.text}"
+        return f"DeepSeek request failed: {response.status_code} {response.text}", False
 
     try:
         data = response.json()
     except ValueError:
-        return "DeepSeek request failed: invalid JSON response"
+        return "DeepSeek request failed: invalid JSON response", False
+
+    usage = data.get("usage") or {}
+    _record(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+    return data.get("choices", [{}])[0].get("message", {}).get("content") or "", True
+
+
+def _streaming_completion(url: str, headers: dict, payload: dict) -> tuple[str, bool]:
+    # Server-sent events: the read timeout bounds the wait for each chunk, while the
+    # first-token and total deadlines are checked as chunks arrive.
+    payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+    started = time.monotonic()
+    parts = []
+    usage = {}
+    first_token_at = None
+    finished = False
+    error = ""
+    try:
+        # The DeepSeek concurrency slot is held until the whole generation has been read.
+        with http_client.stream(
+            "deepseek",
+            "POST",
+            url,
+            json=payload,
+            headers=headers,
+            timeout=(Config.DEEPSEEK_CONNECT_TIMEOUT, Config.DEEPSEEK_FIRST_TOKEN_TIMEOUT),
+        ) as response:
+            if response.status_code != 200:
+                _record()
+                return f"DeepSeek request failed: {response.status_code} {response.text}", False
+
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    now = time.monotonic()
+                    if first_token_at is None and now - started > Config.DEEPSEEK_FIRST_TOKEN_TIMEOUT:
+                        error = "first token timeout"
+                        break
+                    if now - started > Config.DEEPSEEK_TOTAL_TIMEOUT:
+                        error = "total timeout"
+                        break
+                    if not line or not line.startswith("data:"):
+                        continue
+
+                    data = line[len("data:") :].strip()
+                    if data == "[DONE]":
+                        finished = True
+                        break
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        continue
+
+                    usage = event.get("usage") or usage
+                    for choice in event.get("choices") or []:
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            first_token_at = first_token_at or now
+                            parts.append(delta)
+                        if choice.get("finish_reason"):
+                            finished = True
+            except requests.RequestException as exc:
+                error = "first token timeout" if first_token_at is None else f"stream error: {exc}"
+    except requests.RequestException as exc:
+        _record(first_token_timeouts=int(isinstance(exc, requests.Timeout)))
+        return f"DeepSeek network error: {exc}", False
+
+    duration = time.monotonic() - started
+    text = "".join(parts)
+    completion_tokens = usage.get("completion_tokens") or prompt_builder.estimate_tokens(text)
+    ttft = first_token_at - started if first_token_at else duration
+    stream_time = duration - ttft
+    tracing.annotate(
+        ttft_s=round(ttft, 3),
+        completion_tokens=completion_tokens,
+        tokens_per_s=round(completion_tokens / stream_time, 1) if stream_time > 0 else 0,
+        prompt_tokens=usage.get("prompt_tokens", 0),
+        stream_error=error,
+    )
+
+    if finished and not error:
+        _record(usage.get("prompt_tokens", 0), completion_tokens)
+        return text, True
+
+    partial = _salvage_partial(text)
+    _record(
+        usage.get("prompt_tokens", 0),
+        completion_tokens,
+        partial_results=int(bool(partial)),
+        first_token_timeouts=int(error == "first token timeout"),
+        total_timeouts=int(error == "total timeout"),
+    )
+    if partial:
+        return partial, False
+    return f"DeepSeek stream failed: {error or 'stream ended before completion'}", False
+
+
+@metrics.timed("deepseek_completion")
+def _chat_completion(prompt: str) -> tuple[str, bool]:
+    # Returns (text, complete). Incomplete text is either an error message or validated
+    # partial output from a stream that was cut off.
+    url = f"{Config.DEEPSEEK_API_BASE}/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {Config.DEEPSEEK_API_KEY}",
+        "Content-Type": "application/json",
+    }
+    payload = _request_payload(prompt)
+    if Config.DEEPSEEK_STREAM:
+        return _streaming_completion(url, headers, payload)
+    return _blocking_completion(url, headers, payload)
+
+
+def _chunked_summary(file_change: dict, context: dict) -> tuple[str, bool]:
+    # Over-budget files are split on module/class/function boundaries, each chunk is
+    # condensed to notes in parallel, and one final call turns the notes into the page HTML.
+    chunks = prompt_builder.split_into_chunks(file_change.get("content", ""), Config.DEEPSEEK_CHUNK_TOKENS)
+    # Past the cap the rest of the file goes undocumented and the summary is marked partial.
+    covered = chunks[: max(1, Config.DEEPSEEK_MAX_CHUNKS)]
+    prompts = [
+        prompt_builder.truncate_to_tokens(
+            prompt_builder.build_chunk_prompt(file_change, chunk, index, len(chunks)),
+            Config.DEEPSEEK_PROMPT_TOKEN_BUDGET,
+        )
+        for index, chunk in enumerate(covered)
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, Config.DEEPSEEK_CHUNK_WORKERS)) as executor:
+        results = list(executor.map(tracing.bind(_chat_completion), prompts))
+
+    for note, _complete in results:
+        if _is_error(note):
+            return note, False
+
+    notes = [note for note, _complete in results]
+    merge_prompt = prompt_builder.build_merge_prompt(file_change, context, notes)
+    summary, complete = _chat_completion(
+        prompt_builder.truncate_to_tokens(merge_prompt, Config.DEEPSEEK_PROMPT_TOKEN_BUDGET)
+    )
+    if len(covered) < len(chunks) and not _is_error(summary):
+        summary += _TRUNCATED_NOTE.format(covered=len(covered), total=len(chunks))
+    return summary, complete and all(complete for _note, complete in results)
+
+
+def _incremental_update(file_change: dict, context: dict, previous_summary: str) -> tuple[str, bool] | None:
+    # Revise only the rows and sections touched by the patch and splice them into the stored
+    # summary; returns (summary, complete). None means the change does not qualify and a full
+    # summary is needed.
+    content = file_change.get("content", "")
+    change = incremental_summary.touched_symbols(content, file_change.get("patch", ""))
+    if not change:
+        return None
+
+    changed_tokens = prompt_builder.estimate_tokens(change["source"])
+    if changed_tokens > Config.DEEPSEEK_INCREMENTAL_MAX_RATIO * prompt_builder.estimate_tokens(content):
+        return None
+
+    previous_risks = incremental_summary.section_content(previous_summary, incremental_summary.REVISED_SECTIONS["risks"])
+    prompt = prompt_builder.build_revision_prompt(
+        file_change,
+        context,
+        change,
+        previous_rows=incremental_summary.function_rows(previous_summary, change["symbols"] + change["removed"]),
+        previous_risks=previous_risks,
+    )
+    if prompt_builder.estimate_tokens(prompt) > Config.DEEPSEEK_PROMPT_TOKEN_BUDGET:
+        return None
+
+    response, complete = _chat_completion(prompt)
+    if _is_error(response):
+        return response, False
+
+    revision = incremental_summary.parse_revision(response)
+    if not revision:
+        return None
+    summary = incremental_summary.splice_revision(previous_summary, revision, change["removed"])
+    if summary is None:
+        # The stored summary lacks a section to splice into (e.g. it was itself partial).
+        return None
+    if not complete and _PARTIAL_NOTE not in summary:
+        # A cut-off revision can still carry every section marker, with the last one truncated.
+        summary += _PARTIAL_NOTE
+    return summary, complete
+
+
+def generate_script_summary(file_change: dict, context: dict, previous_summary: str = "") -> str:
+    if not Config.DEEPSEEK_API_KEY:
+        return "[DeepSeek disabled] Set DEEPSEEK_API_KEY to generate AI summary."
+
+    # Keyed on content only, so reverts, cherry-picks and copies across repos reuse the summary.
+    cache_key = _summary_cache_key(file_change)
+    cached = summary_cache.get_summary(cache_key)
+    if cached is not None:
+        return cached
+
+    revised = None
+    if Config.DEEPSEEK_INCREMENTAL and previous_summary and file_change.get("status") == "modified":
+        revised = _incremental_update(file_change=file_change, context=context, previous_summary=previous_summary)
+
+    if revised is not None:
+        summary, complete = revised
+    else:
+        prompt = prompt_builder.build_summary_prompt(file_change=file_change, context=context)
+        if prompt_builder.estimate_tokens(prompt) <= Config.DEEPSEEK_PROMPT_TOKEN_BUDGET:
+            summary, complete = _chat_completion(prompt)
+        else:
+            summary, complete = _chunked_summary(file_change=file_change, context=context)
+
+    if _is_error(summary):
+        return summary
+    if not summary:
+        return "No summary returned."
+
+    # Partial output from a cut-off stream is published but not memoized.
+    if complete:
+        summary_cache.put_summary(cache_key, summary)
+    return summary
+
+
+def _summary_cache_key(file_change: dict) -> str:
+    return summary_cache.make_key(file_change.get("content", ""), Config.DEEPSEEK_MODEL, prompt_builder.PROMPT_VERSION)
+
+
+def plan_batches(file_changes: list[dict]) -> list[list[dict]]:
+    # Greedy packing in input order under the per-request token budget and file cap.
+    batches, current, current_tokens = [], [], 0
+    for file_change in file_changes:
+        tokens = prompt_builder.estimate_tokens(file_change.get("content", "")) + prompt_builder.estimate_tokens(
+            file_change.get("patch", "")
+        )
+        full = len(current) >= Config.DEEPSEEK_BATCH_MAX_FILES
+        if current and (full or current_tokens + tokens > Config.DEEPSEEK_BATCH_TOKEN_BUDGET):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(file_change)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def is_batchable(file_change: dict) -> bool:
+    return (
+        Config.DEEPSEEK_BATCHING
+        and file_change.get("status") != "removed"
+        and prompt_builder.estimate_tokens(file_change.get("content", "")) <= Config.DEEPSEEK_BATCH_FILE_TOKENS
+    )
+
+
+def generate_batch_summaries(file_changes: list[dict], context: dict) -> dict[str, str]:
+    # One request documents several small files; each file's section is split back out by
+    # its FILE marker. Files missing from the reply are retried as single-file requests.
+    if not Config.DEEPSEEK_API_KEY:
+        return {fc.get("path"): generate_script_summary(file_change=fc, context=context) for fc in file_changes}
+
+    summaries = {}
+    pending = []
+    for file_change in file_changes:
+        cached = summary_cache.get_summary(_summary_cache_key(file_change))
+        if cached is not None:
+            summaries[file_change.get("path")] = cached
+        else:
+            pending.append(file_change)
+
+    if len(pending) > 1:
+        response, complete = _chat_completion(prompt_builder.build_batch_prompt(pending, context))
+        if _is_error(response):
+            return {**summaries, **{fc.get("path"): response for fc in pending}}
+
+        sections = {path.strip(): body.strip() for path, body in _BATCH_SECTION_RE.findall(response)}
+        unparsed = []
+        for file_change in pending:
+            summary = sections.get(file_change.get("path"), "")
+            if "<h3>" not in summary:
+                unparsed.append(file_change)
+                continue
+            summaries[file_change.get("path")] = summary
+            if complete:
+                summary_cache.put_summary(_summary_cache_key(file_change), summary)
+        if unparsed:
+            print(f"[deepseek] batch reply missing {len(unparsed)} of {len(pending)} files; retrying singly")
+        pending = unparsed
 
-    return data.get("choices", [{}])[0].get("message", {}).get("content", "No summary returned.")
+    for file_change in pending:
+        summaries[file_change.get("path")] = generate_script_summary(file_change=file_change, context=context)
+    return summaries
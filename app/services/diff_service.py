@@ -1,8 +1,15 @@
 import base64
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator
 from urllib.parse import quote
 import requests
 
 from app.config import Config
+from app.services import blob_cache, git_mirror, http_client, metrics, tracing
+from app.services.resilience import raise_if_unavailable
 
 
 def _github_headers() -> dict:
@@ -12,17 +19,93 @@ def _github_headers() -> dict:
     return headers
 
 
-def _fetch_file_content(owner: str, repo: str, path: str, ref: str) -> str:
+def _rate_limit_delay(response: requests.Response, attempt: int) -> float | None:
+    # GitHub signals primary and secondary rate limits with 429, or 403 plus
+    # Retry-After / X-RateLimit-Remaining: 0. Anything else is not worth retrying.
+    headers = response.headers
+    remaining = headers.get("X-RateLimit-Remaining")
+    retry_after = headers.get("Retry-After")
+    if response.status_code == 403 and not retry_after and remaining != "0":
+        return None
+    if response.status_code not in (403, 429):
+        return None
+
+    if retry_after and retry_after.isdigit():
+        delay = float(retry_after)
+    elif remaining == "0" and headers.get("X-RateLimit-Reset", "").isdigit():
+        delay = float(headers["X-RateLimit-Reset"]) - time.time()
+    else:
+        delay = Config.GITHUB_BACKOFF_SECONDS * (2**attempt)
+    return min(max(delay, 1.0), Config.GITHUB_MAX_BACKOFF_SECONDS)
+
+
+def _github_get(url: str, params: dict | None = None) -> requests.Response:
+    attempt = 0
+    while True:
+        response = http_client.request("github", "GET", url, headers=_github_headers(), params=params)
+        delay = _rate_limit_delay(response, attempt)
+        if delay is None or attempt >= Config.GITHUB_MAX_RETRIES:
+            return response
+        print(f"[github] rate limited status={response.status_code} retry_in={delay:.1f}s url={url}")
+        time.sleep(delay)
+        attempt += 1
+
+
+def _decode_content(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
+
+
+def _use_mirror() -> bool:
+    return Config.DIFF_BACKEND == "mirror"
+
+
+# Fetch helpers return None when GitHub could not be read, as opposed to an empty result.
+def _fetch_blob_content(owner: str, repo: str, sha: str) -> str | None:
+    if _use_mirror():
+        return _decode_content(git_mirror.read_blob(owner, repo, sha))
+
+    cached = blob_cache.get_blob(sha)
+    if cached is not None:
+        return _decode_content(cached)
+
+    url = f"{Config.GITHUB_API_BASE}/repos/{owner}/{repo}/git/blobs/{sha}"
+    try:
+        response = _github_get(url)
+    except requests.RequestException:
+        return None
+
+    if response.status_code != 200:
+        return None
+
+    data = response.json()
+    content = data.get("content", "")
+    if data.get("encoding") != "base64" or not content:
+        return ""
+
+    try:
+        raw = base64.b64decode(content)
+    except ValueError:
+        return ""
+
+    blob_cache.put_blob(sha, raw)
+    return _decode_content(raw)
+
+
+@metrics.timed("github_content")
+def _fetch_file_content(owner: str, repo: str, path: str, ref: str, sha: str = "") -> str | None:
+    if sha:
+        return _fetch_blob_content(owner=owner, repo=repo, sha=sha)
+
     encoded_path = quote(path)
-    url = f"https://api.github.com/repos/{owner}/{repo}/contents/{encoded_path}"
+    url = f"{Config.GITHUB_API_BASE}/repos/{owner}/{repo}/contents/{encoded_path}"
     params = {"ref": ref}
     try:
-        response = requests.get(url, headers=_github_headers(), params=params, timeout=30)
+        response = _github_get(url, params=params)
     except requests.RequestException:
-        return ""
+        return None
 
     if response.status_code != 200:
-        return ""
+        return None
 
     data = response.json()
     content = data.get("content", "")
@@ -31,20 +114,24 @@ def _fetch_file_content(owner: str, repo: str, path: str, ref: str) -> str:
         return ""
 
     try:
-        return base64.b64decode(content).decode("utf-8", errors="replace")
-    except (ValueError, UnicodeDecodeError):
+        return _decode_content(base64.b64decode(content))
+    except ValueError:
         return ""
 
 
-def _get_compare_files(owner: str, repo: str, base_sha: str, head_sha: str) -> dict:
-    url = f"https://api.github.com/repos/{owner}/{repo}/compare/{base_sha}...{head_sha}"
+@metrics.timed("github_compare")
+def _get_compare_files(owner: str, repo: str, base_sha: str, head_sha: str) -> dict | None:
+    if _use_mirror():
+        return git_mirror.compare_files(owner, repo, base_sha, head_sha)
+
+    url = f"{Config.GITHUB_API_BASE}/repos/{owner}/{repo}/compare/{base_sha}...{head_sha}"
     try:
-        response = requests.get(url, headers=_github_headers(), timeout=30)
+        response = _github_get(url)
     except requests.RequestException:
-        return {}
+        return None
 
     if response.status_code != 200:
-        return {}
+        return None
 
     data = response.json()
     files = data.get("files", [])
@@ -56,73 +143,140 @@ def _get_compare_files(owner: str, repo: str, base_sha: str, head_sha: str) -> d
         file_map[filename] = {
             "status": file_info.get("status", "modified"),
             "patch": file_info.get("patch", ""),
+            "sha": file_info.get("sha", ""),
         }
     return file_map
 
 
-def _list_python_files_at_ref(owner: str, repo: str, ref: str) -> list[str]:
-    url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/{ref}"
+@metrics.timed("github_tree")
+def _list_python_files_at_ref(owner: str, repo: str, ref: str) -> dict[str, str] | None:
+    if _use_mirror():
+        return git_mirror.list_python_files(owner, repo, ref)
+
+    url = f"{Config.GITHUB_API_BASE}/repos/{owner}/{repo}/git/trees/{ref}"
     params = {"recursive": "1"}
     try:
-        response = requests.get(url, headers=_github_headers(), params=params, timeout=30)
+        response = _github_get(url, params=params)
     except requests.RequestException:
-        return []
+        return None
 
     if response.status_code != 200:
-        return []
+        return None
 
     data = response.json()
     tree = data.get("tree", [])
-    paths = []
+    blob_shas = {}
     for entry in tree:
         if entry.get("type") != "blob":
             continue
         path = entry.get("path", "")
         if path.endswith(".py"):
-            paths.append(path)
-    return paths
+            blob_shas[path] = entry.get("sha", "")
+    return blob_shas
+
+
+def _script_name(path: str) -> str:
+    return path.rsplit("/", 1)[-1].rsplit(".py", 1)[0]
 
 
-def get_repository_python_files(owner: str, repo: str, base_sha: str, head_sha: str) -> list[dict]:
+def iter_repository_python_files(
+    owner: str,
+    repo: str,
+    base_sha: str,
+    head_sha: str,
+    include_unchanged: bool = False,
+) -> Iterator[dict]:
+    # Yields file changes one at a time, sorted by path, with removed scripts last. At most
+    # GITHUB_FETCH_WORKERS contents are fetched ahead of the consumer, so memory does not grow
+    # with the size of the repository.
+    if _use_mirror():
+        # Mirror errors propagate: the job fails and the queue retries it.
+        git_mirror.update_mirror(owner, repo, head_sha)
+    # A read that failed while GitHub is down or out of quota aborts the job so the queue
+    # retries it later; other failures (e.g. a force-pushed base) still leave the file out.
     compare_map = _get_compare_files(owner=owner, repo=repo, base_sha=base_sha, head_sha=head_sha)
-    current_files = _list_python_files_at_ref(owner=owner, repo=repo, ref=head_sha)
-    results = []
+    if compare_map is None:
+        raise_if_unavailable("github")
+        compare_map = {}
+    if include_unchanged:
+        # Bootstrap / resync: walk the whole head tree so unchanged scripts get documented too.
+        current_files = _list_python_files_at_ref(owner=owner, repo=repo, ref=head_sha)
+        if current_files is None:
+            raise_if_unavailable("github")
+            current_files = {}
+    else:
+        # Incremental: only paths the compare reports as present at head need their content.
+        current_files = {
+            filename: change_info.get("sha", "")
+            for filename, change_info in compare_map.items()
+            if change_info.get("status") != "removed"
+        }
+    filenames = sorted(current_files)
 
-    for filename in sorted(current_files):
-        change_info = compare_map.get(filename, {})
-        status = change_info.get("status", "unchanged")
-        content = _fetch_file_content(
+    def fetch(filename: str) -> str | None:
+        return _fetch_file_content(
             owner=owner,
             repo=repo,
             path=filename,
             ref=head_sha,
+            sha=current_files[filename] or compare_map.get(filename, {}).get("sha", ""),
         )
-        if not content.strip() and status != "removed":
-            continue
 
-        script_name = filename.rsplit("/", 1)[-1].rsplit(".py", 1)[0]
-        results.append(
-            {
+    workers = max(1, Config.GITHUB_FETCH_WORKERS)
+    remaining = iter(filenames)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        bound_fetch = tracing.bind(fetch)
+        window = deque((name, executor.submit(bound_fetch, name)) for name in islice(remaining, workers))
+        while window:
+            filename, future = window.popleft()
+            content = future.result()
+            if content is None:
+                raise_if_unavailable("github")
+                content = ""
+            following = next(remaining, None)
+            if following is not None:
+                window.append((following, executor.submit(bound_fetch, following)))
+
+            change_info = compare_map.get(filename, {})
+            status = change_info.get("status", "unchanged")
+            if not content.strip() and status != "removed":
+                continue
+
+            yield {
                 "path": filename,
-                "script_name": script_name,
+                "script_name": _script_name(filename),
                 "status": status,
                 "patch": change_info.get("patch", ""),
+                "sha": current_files[filename] or change_info.get("sha", ""),
                 "content": content,
             }
-        )
 
     for filename, change_info in compare_map.items():
         if change_info.get("status") != "removed":
             continue
-        script_name = filename.rsplit("/", 1)[-1].rsplit(".py", 1)[0]
-        results.append(
-            {
-                "path": filename,
-                "script_name": script_name,
-                "status": "removed",
-                "patch": change_info.get("patch", ""),
-                "content": "",
-            }
-        )
+        yield {
+            "path": filename,
+            "script_name": _script_name(filename),
+            "status": "removed",
+            "patch": change_info.get("patch", ""),
+            "sha": change_info.get("sha", ""),
+            "content": "",
+        }
+
 
-    return results
+def get_repository_python_files(
+    owner: str,
+    repo: str,
+    base_sha: str,
+    head_sha: str,
+    include_unchanged: bool = False,
+) -> list[dict]:
+    return list(
+        iter_repository_python_files(
+            owner=owner,
+            repo=repo,
+            base_sha=base_sha,
+            head_sha=head_sha,
+            include_unchanged=include_unchanged,
+        )
+    )
@@ -0,0 +1,181 @@
+import base64
+import fcntl
+import os
+import subprocess
+import threading
+
+from app.config import Config
+from app.services import metrics
+
+
+# Bare mirrors of the watched repositories. Compare, tree listing and content reads become
+# local git plumbing calls instead of GitHub REST requests (and are not capped at 300 files).
+_EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+_STATUS = {"A": "added", "M": "modified", "D": "removed", "T": "modified"}
+
+_repo_locks: dict[str, threading.Lock] = {}
+_repo_locks_guard = threading.Lock()
+
+
+class MirrorError(Exception):
+    pass
+
+
+def _mirror_path(owner: str, repo: str) -> str:
+    return os.path.join(Config.GIT_MIRROR_DIR, owner, f"{repo}.git")
+
+
+def _remote_url(owner: str, repo: str) -> str:
+    return Config.GIT_MIRROR_URL.format(owner=owner, repo=repo)
+
+
+def _auth_env(url: str) -> dict[str, str] | None:
+    # The token goes in a per-command header passed through the environment: it is never
+    # written to the mirror's config on disk and never shows up in the process list.
+    if not Config.GITHUB_TOKEN or not url.startswith("https://"):
+        return None
+    credentials = base64.b64encode(f"x-access-token:{Config.GITHUB_TOKEN}".encode("utf-8")).decode("ascii")
+    return {
+        **os.environ,
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": "http.extraHeader",
+        "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}",
+    }
+
+
+def _git(
+    args: list[str],
+    git_dir: str | None = None,
+    timeout: float | None = None,
+    env: dict[str, str] | None = None,
+) -> bytes:
+    command = ["git"]
+    if git_dir:
+        command += ["--git-dir", git_dir]
+    command += args
+    name = next((arg for arg in args if not arg.startswith("-") and "=" not in arg), "command")
+    try:
+        completed = subprocess.run(
+            command,
+            capture_output=True,
+            timeout=timeout or Config.GIT_COMMAND_TIMEOUT,
+            env=env,
+            check=False,
+        )
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        raise MirrorError(f"git {name} failed: {exc}") from exc
+    if completed.returncode != 0:
+        stderr = completed.stderr.decode("utf-8", errors="replace").strip()
+        raise MirrorError(f"git {name} failed ({completed.returncode}): {stderr[:500]}")
+    return completed.stdout
+
+
+def _repo_lock(path: str) -> threading.Lock:
+    with _repo_locks_guard:
+        lock = _repo_locks.get(path)
+        if lock is None:
+            lock = threading.Lock()
+            _repo_locks[path] = lock
+        return lock
+
+
+def _has_commit(git_dir: str, sha: str) -> bool:
+    try:
+        _git(["cat-file", "-e", f"{sha}^{{commit}}"], git_dir=git_dir)
+    except MirrorError:
+        return False
+    return True
+
+
+@metrics.timed("git_fetch")
+def update_mirror(owner: str, repo: str, head_sha: str) -> str:
+    # Creates the bare repository on first use, then fetches only when the pushed head is not
+    # yet present. Only branches are fetched (a full mirror would also pull refs/pull/*).
+    # Threads share a lock per mirror; other processes are kept out with a lock file.
+    path = _mirror_path(owner, repo)
+    url = _remote_url(owner, repo)
+    with _repo_lock(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.isdir(path):
+                    _git(["init", "--bare", "--quiet", path])
+                if not _has_commit(path, head_sha):
+                    _git(
+                        ["fetch", "--prune", "--quiet", url, "+refs/heads/*:refs/heads/*"],
+                        git_dir=path,
+                        timeout=Config.GIT_FETCH_TIMEOUT,
+                        env=_auth_env(url),
+                    )
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    if not _has_commit(path, head_sha):
+        raise MirrorError(f"{head_sha} not found in mirror of {owner}/{repo} after fetch")
+    return path
+
+
+def _is_null_sha(sha: str) -> bool:
+    return not sha or set(sha) == {"0"}
+
+
+def _split_patches(diff: bytes) -> list[str]:
+    # One block per file, in the same order as diff-tree lists them. Headers are dropped so
+    # each patch starts at its first hunk, like the compare API's "patch" field.
+    blocks = []
+    for block in diff.decode("utf-8", errors="replace").split("\ndiff --git "):
+        if not block.strip():
+            continue
+        hunk_start = block.find("\n@@")
+        blocks.append(block[hunk_start + 1 :] if hunk_start >= 0 else "")
+    return blocks
+
+
+def compare_files(owner: str, repo: str, base_sha: str, head_sha: str) -> dict:
+    path = _mirror_path(owner, repo)
+    # A push that creates a branch has an all-zero "before"; diff against the empty tree.
+    base = _EMPTY_TREE if _is_null_sha(base_sha) else base_sha
+    if base != _EMPTY_TREE and not _has_commit(path, base):
+        # Force-pushed away and garbage collected upstream: nothing to diff against.
+        base = _EMPTY_TREE
+
+    raw = _git(["diff-tree", "-r", "-z", "--no-renames", base, head_sha, "--", "*.py"], git_dir=path)
+    fields = raw.decode("utf-8", errors="surrogateescape").split("\0")
+    entries = []
+    for index in range(0, len(fields) - 1, 2):
+        meta, filename = fields[index], fields[index + 1]
+        # ":<old mode> <new mode> <old sha> <new sha> <status>"
+        _old_mode, _new_mode, old_sha, new_sha, status = meta.lstrip(":").split(" ")
+        entries.append((filename, _STATUS.get(status[:1], "modified"), new_sha if status != "D" else old_sha))
+
+    diff = _git(
+        ["diff", "--no-renames", "--no-color", "--no-ext-diff", "-U3", base, head_sha, "--", "*.py"],
+        git_dir=path,
+    )
+    patches = _split_patches(diff)
+    if len(patches) != len(entries):
+        patches = [""] * len(entries)
+
+    file_map = {}
+    for (filename, status, sha), patch in zip(entries, patches):
+        if filename.endswith(".py"):
+            file_map[filename] = {"status": status, "patch": patch, "sha": sha}
+    return file_map
+
+
+def list_python_files(owner: str, repo: str, ref: str) -> dict[str, str]:
+    raw = _git(["ls-tree", "-r", "-z", ref], git_dir=_mirror_path(owner, repo))
+    blob_shas = {}
+    for entry in raw.decode("utf-8", errors="surrogateescape").split("\0"):
+        if not entry:
+            continue
+        meta, filename = entry.split("\t", 1)
+        _mode, object_type, sha = meta.split(" ")
+        if object_type == "blob" and filename.endswith(".py"):
+            blob_shas[filename] = sha
+    return blob_shas
+
+
+def read_blob(owner: str, repo: str, sha: str) -> bytes:
+    return _git(["cat-file", "blob", sha], git_dir=_mirror_path(owner, repo))
@@ -0,0 +1,160 @@
+import contextlib
+import json
+import threading
+import time
+from typing import Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.config import Config
+from app.services import metrics, resilience, tracing
+
+
+# Retried on 5xx and connection errors. POST is left out because chat completions and
+# page creates are not idempotent; their callers decide what a failure means.
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_slots: dict[str, threading.BoundedSemaphore] = {}
+
+
+def _upstream_settings(upstream: str) -> tuple[int, float]:
+    settings = {
+        "github": (Config.GITHUB_HTTP_POOL_SIZE, Config.GITHUB_HTTP_TIMEOUT),
+        "deepseek": (Config.DEEPSEEK_HTTP_POOL_SIZE, Config.DEEPSEEK_HTTP_TIMEOUT),
+        "confluence": (Config.CONFLUENCE_HTTP_POOL_SIZE, Config.CONFLUENCE_HTTP_TIMEOUT),
+    }
+    return settings.get(upstream, (Config.HTTP_POOL_SIZE, Config.HTTP_TIMEOUT))
+
+
+def _build_session(pool_size: int) -> requests.Session:
+    # 429 is never retried here and Retry-After is ignored: an upstream's requested wait can be
+    # arbitrarily long, so rate-limit responses go to the limiter and breaker, which cap it.
+    retry = Retry(
+        total=Config.HTTP_MAX_RETRIES,
+        backoff_factor=Config.HTTP_BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=_IDEMPOTENT_METHODS,
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(upstream: str) -> requests.Session:
+    with _sessions_lock:
+        session = _sessions.get(upstream)
+        if session is None:
+            pool_size, _timeout = _upstream_settings(upstream)
+            session = _build_session(pool_size)
+            _sessions[upstream] = session
+        return session
+
+
+def _concurrency_limit(upstream: str) -> int:
+    limits = {
+        "deepseek": Config.DEEPSEEK_CONCURRENCY,
+        "confluence": Config.CONFLUENCE_CONCURRENCY,
+    }
+    return limits.get(upstream, 0)
+
+
+def _request_slot(upstream: str) -> threading.BoundedSemaphore | None:
+    # Process-wide cap on in-flight requests per upstream, shared by every job and script.
+    limit = _concurrency_limit(upstream)
+    if limit <= 0:
+        return None
+    with _sessions_lock:
+        slot = _slots.get(upstream)
+        if slot is None:
+            slot = threading.BoundedSemaphore(limit)
+            _slots[upstream] = slot
+        return slot
+
+
+def _request_size(kwargs: dict) -> int:
+    if kwargs.get("json") is not None:
+        return len(json.dumps(kwargs["json"]).encode("utf-8"))
+    data = kwargs.get("data")
+    if kwargs.get("files"):
+        # Multipart uploads: count the file payloads, ignoring the form framing.
+        return sum(len(value[1]) for value in kwargs["files"].values() if isinstance(value[1], (bytes, str)))
+    return len(data) if isinstance(data, (bytes, str)) else 0
+
+
+def _count_body(response: requests.Response) -> list[int]:
+    # Streamed bodies are counted as the caller reads them (iter_lines reads via iter_content).
+    received = [0]
+    iter_content = response.iter_content
+
+    def counting_iter_content(*args, **kwargs):
+        for chunk in iter_content(*args, **kwargs):
+            received[0] += len(chunk)
+            yield chunk
+
+    response.iter_content = counting_iter_content
+    return received
+
+
+@contextlib.contextmanager
+def _exchange(upstream: str, method: str, url: str, **kwargs) -> Iterator[requests.Response]:
+    # The request slot, the "http" span and the duration sample last until the caller is done
+    # with the response, which for streamed bodies is when the last chunk has been read.
+    kwargs.setdefault("timeout", _upstream_settings(upstream)[1])
+    streamed = bool(kwargs.get("stream"))
+    slot = _request_slot(upstream)
+    with slot or contextlib.nullcontext():
+        with tracing.span("http", upstream=upstream, method=method, url=url.split("?", 1)[0]) as span:
+            bucket = resilience.limiter(upstream)
+            waited = time.perf_counter()
+            bucket.acquire()
+            circuit = resilience.breaker(upstream)
+            circuit.before_request()
+            start = time.perf_counter()
+            try:
+                response = get_session(upstream).request(method, url, **kwargs)
+            except requests.RequestException:
+                circuit.record_failure()
+                metrics.inc("http_requests_total", upstream=upstream, status="exception")
+                metrics.observe("http_request_duration_seconds", time.perf_counter() - start, upstream=upstream)
+                raise
+            metrics.inc("http_requests_total", upstream=upstream, status=response.status_code)
+            bucket.adapt(response)
+            if resilience.is_failure(response):
+                circuit.record_failure()
+            else:
+                circuit.record_success()
+
+            received = _count_body(response) if streamed else None
+            try:
+                yield response
+            finally:
+                metrics.observe("http_request_duration_seconds", time.perf_counter() - start, upstream=upstream)
+                if span is not None:
+                    span.set(
+                        status=response.status_code,
+                        rate_limit_wait_ms=round((start - waited) * 1000, 3),
+                        request_bytes=_request_size(kwargs),
+                        response_bytes=received[0] if streamed else len(response.content),
+                    )
+                if streamed:
+                    response.close()
+
+
+def request(upstream: str, method: str, url: str, **kwargs) -> requests.Response:
+    # The body is read before the slot is released; streamed bodies go through stream().
+    with _exchange(upstream, method, url, **kwargs) as response:
+        return response
+
+
+def stream(upstream: str, method: str, url: str, **kwargs) -> contextlib.AbstractContextManager[requests.Response]:
+    # Streamed request: read the body inside the with block; the upstream concurrency slot
+    # is held until the block exits and the response is closed.
+    return _exchange(upstream, method, url, stream=True, **kwargs)
@@ -0,0 +1,182 @@
+import ast
+import html
+import re
+
+
+_HUNK_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+_DEF_RE = re.compile(r"^\s*(?:async\s+)?(?:def|class)\s+(\w+)")
+_ROW_RE = re.compile(r"<tr>.*?</tr>", re.DOTALL | re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_IDENT_RE = re.compile(r"[A-Za-z_][\w.]*")
+_MARKER_RE = re.compile(r"<!--\s*SECTION:\s*([\w-]+)\s*-->", re.IGNORECASE)
+
+FUNCTIONS_HEADING = "Functions and Return Values"
+REVISED_SECTIONS = {
+    "recent-change-summary": "Recent Change Summary",
+    "risks": "Risks / Follow-ups",
+}
+
+
+def _changed_lines(patch: str) -> tuple[set[int], set[str]]:
+    # Map unified-diff hunks onto line numbers of the new file. A deletion is attributed
+    # to the line just above it, which belongs to the symbol the lines were removed from.
+    touched = set()
+    removed_defs, added_defs = set(), set()
+    new_line = None
+    # Inside a run of deleted lines that began with a def/class, the whole block is gone;
+    # it is reported as removed rather than as an edit of the symbol above it.
+    removing_block = False
+    for line in patch.splitlines():
+        match = _HUNK_RE.match(line)
+        if match:
+            new_line = int(match.group(1))
+            removing_block = False
+            continue
+        if new_line is None or line.startswith("\\"):
+            continue
+        if line.startswith("-"):
+            definition = _DEF_RE.match(line[1:])
+            if definition:
+                removed_defs.add(definition.group(1))
+                removing_block = True
+            if not removing_block:
+                touched.add(max(1, new_line - 1))
+            continue
+
+        removing_block = False
+        if line.startswith("+"):
+            touched.add(new_line)
+            definition = _DEF_RE.match(line[1:])
+            if definition:
+                added_defs.add(definition.group(1))
+        new_line += 1
+    return touched, removed_defs - added_defs
+
+
+def _symbols(tree: ast.Module) -> list[tuple[str, int, int]]:
+    symbols = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append((node.name, node.lineno, node.end_lineno))
+        elif isinstance(node, ast.ClassDef):
+            symbols.append((node.name, node.lineno, node.end_lineno))
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    symbols.append((f"{node.name}.{item.name}", item.lineno, item.end_lineno))
+    return symbols
+
+
+def touched_symbols(content: str, patch: str) -> dict | None:
+    # Returns the innermost symbols each hunk touches, the source of those symbols and
+    # definitions the patch deletes, or None when the patch cannot be mapped onto the file.
+    touched, removed = _changed_lines(patch)
+    if not touched and not removed:
+        return None
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+
+    lines = content.splitlines()
+    symbols = _symbols(tree)
+    names, module_level = [], False
+    for lineno in sorted(touched):
+        containing = [symbol for symbol in symbols if symbol[1] <= lineno <= symbol[2]]
+        if not containing:
+            module_level = True
+            continue
+        name = min(containing, key=lambda symbol: symbol[2] - symbol[1])[0]
+        if name not in names:
+            names.append(name)
+
+    spans = {name: (start, end) for name, start, end in symbols}
+    # A method inside a touched class is already covered by the class source.
+    sources = [
+        "\n".join(lines[spans[name][0] - 1 : spans[name][1]])
+        for name in names
+        if "." not in name or name.split(".", 1)[0] not in names
+    ]
+    return {
+        "symbols": names,
+        "removed": sorted(removed),
+        "module_level": module_level,
+        "source": "\n\n".join(sources),
+    }
+
+
+def _section_bounds(summary_html: str, heading: str) -> tuple[int, int] | None:
+    match = re.search(rf"<h3>\s*{re.escape(heading)}\s*</h3>", summary_html, re.IGNORECASE)
+    if not match:
+        return None
+    following = re.search(r"<h3>", summary_html[match.end() :], re.IGNORECASE)
+    end = match.end() + following.start() if following else len(summary_html)
+    return match.end(), end
+
+
+def section_content(summary_html: str, heading: str) -> str:
+    bounds = _section_bounds(summary_html, heading)
+    return summary_html[bounds[0] : bounds[1]].strip() if bounds else ""
+
+
+def _row_key(row_html: str) -> str:
+    cells = re.findall(r"<td>(.*?)</td>", row_html, re.DOTALL | re.IGNORECASE)
+    if not cells:
+        return ""
+    match = _IDENT_RE.search(html.unescape(_TAG_RE.sub("", cells[0])))
+    return match.group(0) if match else ""
+
+
+def _matches(key: str, name: str) -> bool:
+    return key == name or key == name.rsplit(".", 1)[-1] or key.rsplit(".", 1)[-1] == name
+
+
+def function_rows(summary_html: str, names: list[str]) -> list[str]:
+    bounds = _section_bounds(summary_html, FUNCTIONS_HEADING)
+    if not bounds:
+        return []
+    rows = _ROW_RE.findall(summary_html[bounds[0] : bounds[1]])
+    return [row for row in rows if any(_matches(_row_key(row), name) for name in names)]
+
+
+def parse_revision(response: str) -> dict | None:
+    parts = _MARKER_RE.split(response)
+    sections = {parts[index].lower(): parts[index + 1].strip() for index in range(1, len(parts) - 1, 2)}
+    if "rows" not in sections or not all(key in sections for key in REVISED_SECTIONS):
+        return None
+    return sections
+
+
+def splice_revision(previous_html: str, revision: dict, removed: list[str]) -> str | None:
+    bounds = _section_bounds(previous_html, FUNCTIONS_HEADING)
+    if not bounds:
+        return None
+
+    section = previous_html[bounds[0] : bounds[1]]
+    new_rows = {_row_key(row): row for row in _ROW_RE.findall(revision["rows"]) if _row_key(row)}
+    placed = set()
+
+    def replace_row(match: re.Match) -> str:
+        key = _row_key(match.group(0))
+        if any(_matches(key, name) for name in removed):
+            return ""
+        for new_key, new_row in new_rows.items():
+            if new_key not in placed and _matches(key, new_key):
+                placed.add(new_key)
+                return new_row
+        return match.group(0)
+
+    section = _ROW_RE.sub(replace_row, section)
+    additions = "".join(row for key, row in new_rows.items() if key not in placed)
+    if additions:
+        closing = re.search(r"</tbody>|</table>", section, re.IGNORECASE)
+        if not closing:
+            return None
+        section = section[: closing.start()] + additions + section[closing.start() :]
+    spliced = previous_html[: bounds[0]] + section + previous_html[bounds[1] :]
+
+    for key, heading in REVISED_SECTIONS.items():
+        section_bounds = _section_bounds(spliced, heading)
+        if not section_bounds:
+            return None
+        spliced = spliced[: section_bounds[0]] + revision[key] + spliced[section_bounds[1] :]
+    return spliced
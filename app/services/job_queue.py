@@ -0,0 +1,352 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable
+
+from app.config import Config
+from app.services import sharding, sqlite_store, tracing
+from app.services.resilience import UpstreamUnavailable
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    delivery_id TEXT PRIMARY KEY,
+    repo_key TEXT NOT NULL,
+    context TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT NOT NULL DEFAULT '',
+    available_at REAL NOT NULL,
+    lease_expires REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    superseded_by TEXT NOT NULL DEFAULT '',
+    worker_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS jobs_status_available ON jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS jobs_repo_status ON jobs (repo_key, status);
+"""
+
+_PENDING_STATUSES = ("queued", "running")
+
+_wakeup = threading.Event()
+_workers: list[threading.Thread] = []
+_workers_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    return sqlite_store.connect(Config.JOB_QUEUE_PATH, _SCHEMA)
+
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["context"] = json.loads(job["context"])
+    return job
+
+
+def _public_job(job: dict) -> dict:
+    return {
+        "delivery_id": job["delivery_id"],
+        "repo": job["repo_key"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "last_error": job["last_error"],
+        "superseded_by": job["superseded_by"],
+        "base": job["context"].get("before", ""),
+        "head": job["context"].get("after", ""),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "available_at": job["available_at"],
+    }
+
+
+def _prune(conn: sqlite3.Connection, now: float) -> None:
+    conn.execute(
+        "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?",
+        (*_PENDING_STATUSES, now - Config.JOB_RETENTION_SECONDS),
+    )
+
+
+def _coalesce(
+    conn: sqlite3.Connection, delivery_id: str, repo_key: str, context: dict, now: float
+) -> tuple[dict, float]:
+    # A newer push to the same repo makes older pending work redundant: the new job
+    # compares from the oldest outstanding `before` to its own `after`, queued jobs are
+    # marked superseded and a running job is asked to stop at its next checkpoint.
+    # It also inherits the oldest job's created_at, so a busy repo keeps its place in line.
+    if not repo_key:
+        return context, now
+
+    rows = conn.execute(
+        "SELECT * FROM jobs WHERE repo_key = ? AND status IN (?, ?) ORDER BY created_at",
+        (repo_key, *_PENDING_STATUSES),
+    ).fetchall()
+    if not rows:
+        return context, now
+
+    oldest_before = _row_to_job(rows[0])["context"].get("before", "")
+    for row in rows:
+        if row["status"] == "running" and row["lease_expires"] >= now:
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, superseded_by = ?, updated_at = ? WHERE delivery_id = ?",
+                (delivery_id, now, row["delivery_id"]),
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = 'superseded', superseded_by = ?, lease_expires = 0, updated_at = ? "
+                "WHERE delivery_id = ?",
+                (delivery_id, now, row["delivery_id"]),
+            )
+        print(f"[queue] delivery={row['delivery_id']} superseded_by={delivery_id}")
+
+    if oldest_before:
+        context = {**context, "before": oldest_before}
+    return context, min(now, rows[0]["created_at"])
+
+
+def enqueue(delivery_id: str, context: dict) -> dict:
+    delivery_id = delivery_id or f"local-{uuid.uuid4()}"
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        existing = conn.execute("SELECT * FROM jobs WHERE delivery_id = ?", (delivery_id,)).fetchone()
+        if existing:
+            # GitHub redelivery of the same event: report the job we already have.
+            conn.execute("COMMIT")
+            return _public_job(_row_to_job(existing))
+
+        repo_key = context.get("repo_full_name", "")
+        context, created_at = _coalesce(conn, delivery_id, repo_key, context, now)
+
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", _PENDING_STATUSES
+        ).fetchone()[0]
+        if pending >= Config.JOB_QUEUE_MAX_PENDING:
+            conn.execute("ROLLBACK")
+            raise QueueFull(f"{pending} jobs pending (limit {Config.JOB_QUEUE_MAX_PENDING})")
+
+        conn.execute(
+            "INSERT INTO jobs (delivery_id, repo_key, context, status, available_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (delivery_id, repo_key, json.dumps(context), now, created_at, now),
+        )
+        _prune(conn, now)
+        conn.execute("COMMIT")
+        row = conn.execute("SELECT * FROM jobs WHERE delivery_id = ?", (delivery_id,)).fetchone()
+    finally:
+        conn.close()
+
+    _wakeup.set()
+    return _public_job(_row_to_job(row))
+
+
+def get_job(delivery_id: str) -> dict | None:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE delivery_id = ?", (delivery_id,)).fetchone()
+    finally:
+        conn.close()
+    return _public_job(_row_to_job(row)) if row else None
+
+
+def queue_depth() -> dict:
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    finally:
+        conn.close()
+    return {status: count for status, count in rows}
+
+
+def worker_id(pid: int | None = None) -> str:
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+def _claim(shard: int = 0, shards: int = 1) -> dict | None:
+    now = time.time()
+    conn = _connect()
+    try:
+        # Sharded workers only take repositories that hash to their shard, so a repo's pushes
+        # keep landing on the same process (warm mirror, caches and page index).
+        shard_filter = ""
+        if shards > 1:
+            conn.create_function("repo_shard", 1, lambda key: sharding.shard_for(key, shards), deterministic=True)
+            shard_filter = f"AND repo_shard(repo_key) = {int(shard)} "
+        conn.execute("BEGIN IMMEDIATE")
+        # Running jobs whose lease expired belong to a worker that died (crash or deploy).
+        # A repo with a live running job is skipped so its pushes are applied in order.
+        row = conn.execute(
+            "SELECT * FROM jobs "
+            "WHERE ((status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires < ?)) "
+            "AND repo_key NOT IN ("
+            "    SELECT repo_key FROM jobs WHERE status = 'running' AND lease_expires >= ? AND repo_key != ''"
+            ") "
+            + shard_filter
+            + "ORDER BY created_at LIMIT 1",
+            (now, now, now),
+        ).fetchone()
+        if not row:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_expires = ?, worker_id = ?, "
+            "updated_at = ? WHERE delivery_id = ?",
+            (now + Config.JOB_LEASE_SECONDS, worker_id(), now, row["delivery_id"]),
+        )
+        conn.execute("COMMIT")
+        job = _row_to_job(row)
+        job["attempts"] += 1
+        return job
+    finally:
+        conn.close()
+
+
+def release_jobs(owner: str) -> int:
+    # Requeues the running jobs of a worker process known to be gone, instead of leaving
+    # their repositories blocked until the lease expires.
+    now = time.time()
+    conn = _connect()
+    try:
+        released = conn.execute(
+            "UPDATE jobs SET status = 'queued', available_at = ?, lease_expires = 0, updated_at = ? "
+            "WHERE status = 'running' AND worker_id = ?",
+            (now, now, owner),
+        ).rowcount
+    finally:
+        conn.close()
+    return released
+
+
+def _renew_lease(delivery_id: str) -> bool:
+    now = time.time()
+    conn = _connect()
+    try:
+        renewed = conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE delivery_id = ? AND status = 'running' AND worker_id = ?",
+            (now + Config.JOB_LEASE_SECONDS, delivery_id, worker_id()),
+        ).rowcount
+    finally:
+        conn.close()
+    return bool(renewed)
+
+
+def _heartbeat(delivery_id: str, stopped: threading.Event) -> None:
+    # Keeps a short lease alive while the handler runs, so a dead worker's jobs are reclaimed
+    # within JOB_LEASE_SECONDS while a long job is never mistaken for one.
+    interval = max(1.0, Config.JOB_LEASE_SECONDS / 3)
+    while not stopped.wait(interval):
+        try:
+            if not _renew_lease(delivery_id):
+                return
+        except sqlite3.Error as exc:
+            print(f"[queue] delivery={delivery_id} lease renewal error: {exc}")
+
+
+def is_cancel_requested(delivery_id: str) -> bool:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE delivery_id = ?", (delivery_id,)).fetchone()
+    finally:
+        conn.close()
+    return bool(row and row["cancel_requested"])
+
+
+def _finish(job: dict, error: str = "", cancelled: bool = False, retry_after: float | None = None) -> None:
+    now = time.time()
+    attempts = job["attempts"]
+    if cancelled:
+        status, available_at = "cancelled", job["available_at"]
+    elif not error:
+        status, available_at = "succeeded", job["available_at"]
+    elif retry_after is not None:
+        # Upstream outage or exhausted quota: wait it out without spending an attempt.
+        status, available_at = "queued", now + retry_after
+        attempts -= 1
+    elif job["attempts"] < Config.JOB_MAX_ATTEMPTS:
+        status = "queued"
+        available_at = now + Config.JOB_RETRY_BACKOFF_SECONDS * (2 ** (job["attempts"] - 1))
+    else:
+        status, available_at = "failed", job["available_at"]
+
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, attempts = ?, last_error = ?, available_at = ?, lease_expires = 0, "
+            "updated_at = ? WHERE delivery_id = ?",
+            (status, attempts, error[:2000], available_at, now, job["delivery_id"]),
+        )
+    finally:
+        conn.close()
+    print(f"[queue] delivery={job['delivery_id']} attempt={job['attempts']} status={status}")
+
+
+def _run_job(handler: Callable[[dict, Callable[[], bool]], None], job: dict) -> None:
+    delivery_id = job["delivery_id"]
+    try:
+        with tracing.trace(delivery_id, repo=job["repo_key"], attempt=job["attempts"]):
+            handler(job["context"], lambda: is_cancel_requested(delivery_id))
+    except JobCancelled:
+        _finish(job, cancelled=True)
+    except UpstreamUnavailable as exc:
+        print(f"[webhook] processing deferred: {exc}")
+        _finish(job, error=str(exc), cancelled=is_cancel_requested(delivery_id), retry_after=exc.retry_after)
+    except Exception as exc:
+        print(f"[webhook] processing error: {exc}")
+        # A superseded job is not retried; the newer job already covers its range.
+        _finish(job, error=str(exc) or exc.__class__.__name__, cancelled=is_cancel_requested(delivery_id))
+    else:
+        _finish(job)
+
+
+def _worker_loop(handler: Callable[[dict, Callable[[], bool]], None], shard: int, shards: int) -> None:
+    while True:
+        try:
+            job = _claim(shard, shards)
+        except sqlite3.Error as exc:
+            print(f"[queue] claim error: {exc}")
+            job = None
+
+        if not job:
+            _wakeup.wait(Config.JOB_POLL_SECONDS)
+            _wakeup.clear()
+            continue
+
+        delivery_id = job["delivery_id"]
+        stopped = threading.Event()
+        threading.Thread(target=_heartbeat, args=(delivery_id, stopped), name="job-lease", daemon=True).start()
+        try:
+            _run_job(handler, job)
+        except sqlite3.Error as exc:
+            # The lease is no longer renewed, so another worker picks the job up once it expires.
+            print(f"[queue] delivery={delivery_id} bookkeeping error: {exc}")
+        finally:
+            stopped.set()
+
+
+def start_workers(handler: Callable[[dict, Callable[[], bool]], None], shard: int = 0, shards: int = 1) -> None:
+    with _workers_lock:
+        if _workers:
+            return
+        for index in range(max(1, Config.JOB_WORKERS)):
+            worker = threading.Thread(
+                target=_worker_loop,
+                args=(handler, shard, shards),
+                name=f"job-worker-{index}",
+                daemon=True,
+            )
+            worker.start()
+            _workers.append(worker)
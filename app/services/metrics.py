@@ -0,0 +1,117 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from app.services import tracing
+
+
+# In-process metrics rendered in the Prometheus text exposition format. Kept dependency-free;
+# every worker process exposes its own numbers.
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+_PREFIX = "autodoc"
+
+_lock = threading.Lock()
+_histograms: dict[tuple, dict] = {}
+_counters: dict[tuple, float] = {}
+
+
+def _label_text(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def inc(name: str, amount: float = 1.0, **labels) -> None:
+    key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + amount
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = {"buckets": [0] * len(_BUCKETS), "sum": 0.0, "count": 0}
+            _histograms[key] = histogram
+        index = bisect.bisect_left(_BUCKETS, seconds)
+        if index < len(_BUCKETS):
+            histogram["buckets"][index] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+@contextmanager
+def timer(stage: str):
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with tracing.span(stage):
+            yield
+        outcome = "ok"
+    finally:
+        observe("stage_duration_seconds", time.perf_counter() - start, stage=stage)
+        inc("stage_total", stage=stage, outcome=outcome)
+
+
+def timed(stage: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render(gauges: list[tuple[str, dict, float]] | None = None) -> str:
+    # gauges are values sampled by the caller at scrape time (queue depth, cache stats, ...);
+    # names ending in _total are cumulative and exposed as counters.
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, dict(value, buckets=list(value["buckets"]))) for key, value in _histograms.items())
+
+    lines = []
+    seen = set()
+
+    def declare(name: str, kind: str) -> None:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        metric = f"{_PREFIX}_{name}"
+        declare(metric, "counter")
+        lines.append(f"{metric}{_label_text(dict(labels))} {value:g}")
+
+    for (name, labels), histogram in histograms:
+        metric = f"{_PREFIX}_{name}"
+        declare(metric, "histogram")
+        labels = dict(labels)
+        cumulative = 0
+        for bound, count in zip(_BUCKETS, histogram["buckets"]):
+            cumulative += count
+            lines.append(f"{metric}_bucket{_label_text(dict(labels, le=f'{bound:g}'))} {cumulative}")
+        lines.append(f"{metric}_bucket{_label_text(dict(labels, le='+Inf'))} {histogram['count']}")
+        lines.append(f"{metric}_sum{_label_text(labels)} {histogram['sum']:.6f}")
+        lines.append(f"{metric}_count{_label_text(labels)} {histogram['count']}")
+
+    # The text format requires all samples of a family to be contiguous; group by name,
+    # keeping the callers' order otherwise.
+    order = {}
+    for name, _labels, _value in gauges or []:
+        order.setdefault(name, len(order))
+    for name, labels, value in sorted(gauges or [], key=lambda sample: order[sample[0]]):
+        metric = f"{_PREFIX}_{name}"
+        declare(metric, "counter" if name.endswith("_total") else "gauge")
+        lines.append(f"{metric}{_label_text(labels)} {float(value):g}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,74 @@
+import sqlite3
+import time
+
+from app.config import Config
+from app.services import sqlite_store
+
+
+# Local record of what was last written to each Confluence page, keyed by page title.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_state (
+    title TEXT PRIMARY KEY,
+    page_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    ast_fingerprint TEXT NOT NULL DEFAULT '',
+    source_sha TEXT NOT NULL DEFAULT ''
+);
+"""
+
+
+def _enabled() -> bool:
+    return bool(Config.PAGE_STATE_PATH)
+
+
+def _connect() -> sqlite3.Connection:
+    return sqlite_store.connect(Config.PAGE_STATE_PATH, _SCHEMA)
+
+
+def get_page_state(title: str) -> dict | None:
+    if not _enabled():
+        return None
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT * FROM page_state WHERE title = ?", (title,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return dict(row) if row else None
+
+
+def save_page_state(
+    title: str, page_id: str, fingerprint: str, summary: str = "", ast_fingerprint: str = "", source_sha: str = ""
+) -> None:
+    if not _enabled():
+        return
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_state "
+                "(title, page_id, fingerprint, summary, ast_fingerprint, source_sha, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (title, str(page_id), fingerprint, summary, ast_fingerprint, source_sha, time.time()),
+            )
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return
+
+
+def delete_page_state(title: str) -> None:
+    if not _enabled():
+        return
+    try:
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM page_state WHERE title = ?", (title,))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return
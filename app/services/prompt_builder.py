@@ -0,0 +1,234 @@
+import ast
+
+from app.config import Config
+
+
+# Bump whenever the prompt text below changes so cached summaries from the old prompt are not reused.
+PROMPT_VERSION = "1"
+
+# Rough size of a token for source code and English prose; good enough to budget prompts
+# without shipping a tokenizer for the DeepSeek vocabulary.
+_CHARS_PER_TOKEN = 4
+
+SUMMARY_INSTRUCTIONS = (
+    "You are generating enterprise engineering documentation for Confluence.\n"
+    "Return ONLY valid HTML snippet (no markdown fences) using these tags only: "
+    "h3, h4, p, ul, li, table, thead, tbody, tr, th, td, code, strong.\n"
+    "Use this structure:\n"
+    "- <h3>Purpose</h3>\n"
+    "- <h3>High-Level Flow</h3>\n"
+    "- <h3>Functions and Return Values</h3> as an HTML table with columns: Function, Inputs, Return Value, Notes\n"
+    "- <h3>Input/Output Behavior</h3>\n"
+    "- <h3>Error Handling and Edge Cases</h3>\n"
+    "- <h3>Recent Change Summary</h3>\n"
+    "- <h3>Risks / Follow-ups</h3>\n"
+    "Be concrete and technical. Mention exact function names and return behavior.\n\n"
+)
+
+_CHUNK_INSTRUCTIONS = (
+    "You are reading one part of a larger Python file to help document it.\n"
+    "Return concise plain-text technical notes (no HTML, no markdown fences):\n"
+    "- one line per function, method or class: exact name, inputs, return value, notable behavior\n"
+    "- module-level constants, configuration and side effects\n"
+    "- error handling, edge cases and risks you can see\n"
+    "Do not describe code that is not shown.\n\n"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + "\n... [truncated]"
+
+
+def _action_text(file_change: dict) -> str:
+    status = file_change.get("status")
+    if status == "unchanged":
+        return "script documentation sync"
+    return "new script added" if status == "added" else "existing script updated"
+
+
+def _header(file_change: dict, context: dict) -> str:
+    return (
+        f"Repository: {context.get('repo_full_name')}\n"
+        f"Branch: {context.get('ref')}\n"
+        f"Commit Range: {context.get('before')} -> {context.get('after')}\n\n"
+        f"File Path: {file_change.get('path')}\n"
+        f"Change Type: {_action_text(file_change)}\n\n"
+    )
+
+
+def _patch_text(file_change: dict) -> str:
+    return truncate_to_tokens(file_change.get("patch", ""), Config.DEEPSEEK_PATCH_TOKEN_BUDGET)
+
+
+def build_summary_prompt(file_change: dict, context: dict) -> str:
+    return (
+        SUMMARY_INSTRUCTIONS
+        + _header(file_change, context)
+        + f"Current File Content:\n{file_change.get('content', '')}\n\n"
+        + f"Patch (if available):\n{_patch_text(file_change)}"
+    )
+
+
+def build_batch_prompt(file_changes: list[dict], context: dict) -> str:
+    files = "".join(
+        f"<!-- FILE: {file_change.get('path')} -->\n"
+        f"Change Type: {_action_text(file_change)}\n"
+        f"Current File Content:\n{file_change.get('content', '')}\n\n"
+        f"Patch (if available):\n{_patch_text(file_change)}\n"
+        "<!-- END FILE -->\n\n"
+        for file_change in file_changes
+    )
+    return (
+        SUMMARY_INSTRUCTIONS
+        + f"Document each of the {len(file_changes)} files below separately, in the same order. "
+        + "Wrap each file's documentation exactly like this, with nothing outside the wrappers:\n"
+        + "<!-- FILE: path/of/file.py -->\n...documentation HTML...\n<!-- END FILE -->\n\n"
+        + f"Repository: {context.get('repo_full_name')}\n"
+        + f"Branch: {context.get('ref')}\n"
+        + f"Commit Range: {context.get('before')} -> {context.get('after')}\n\n"
+        + files
+    )
+
+
+def build_chunk_prompt(file_change: dict, chunk: dict, index: int, total: int) -> str:
+    return (
+        _CHUNK_INSTRUCTIONS
+        + f"File Path: {file_change.get('path')}\n"
+        + f"Part {index + 1} of {total}: {chunk['name']} (lines {chunk['start']}-{chunk['end']})\n\n"
+        + f"{chunk['source']}"
+    )
+
+
+def build_merge_prompt(file_change: dict, context: dict, chunk_notes: list[str]) -> str:
+    notes = "\n\n".join(f"Part {index + 1} notes:\n{note}" for index, note in enumerate(chunk_notes))
+    return (
+        SUMMARY_INSTRUCTIONS
+        + "The file is too large to show in full. Write the documentation from these notes, "
+        + "which cover every part of the file in order.\n\n"
+        + _header(file_change, context)
+        + f"Notes:\n{notes}\n\n"
+        + f"Patch (if available):\n{_patch_text(file_change)}"
+    )
+
+
+def build_revision_prompt(
+    file_change: dict,
+    context: dict,
+    change: dict,
+    previous_rows: list[str],
+    previous_risks: str,
+) -> str:
+    removed = ", ".join(change["removed"]) or "none"
+    return (
+        "You are updating existing Confluence documentation for a Python file after a focused change.\n"
+        "Return ONLY the three sections below, each starting with its marker line exactly as shown, "
+        "as HTML using only: p, ul, li, tr, td, code, strong. No markdown fences.\n"
+        "<!-- SECTION: rows -->\n"
+        "one <tr> per changed function, method or class with four <td> cells: Function, Inputs, "
+        "Return Value, Notes. The first cell must be the exact symbol name.\n"
+        "<!-- SECTION: recent-change-summary -->\n"
+        "what this change does and why it matters\n"
+        "<!-- SECTION: risks -->\n"
+        "the existing risks / follow-ups, revised for this change\n\n"
+        + _header(file_change, context)
+        + f"Changed symbols: {', '.join(change['symbols']) or 'none'}\n"
+        + f"Removed symbols: {removed}\n"
+        + f"Module-level statements changed: {'yes' if change['module_level'] else 'no'}\n\n"
+        + "Current documentation rows for the changed symbols:\n"
+        + ("\n".join(previous_rows) or "none")
+        + f"\n\nCurrent risks / follow-ups:\n{previous_risks or 'none'}\n\n"
+        + f"Current source of the changed symbols:\n{change['source']}\n\n"
+        + f"Patch:\n{_patch_text(file_change)}"
+    )
+
+
+def _node_start(node: ast.AST) -> int:
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [decorator.lineno for decorator in decorators])
+
+
+def _symbol_spans(tree: ast.Module, lines: list[str], max_tokens: int) -> list[tuple[str, int, int]]:
+    spans = []
+    for node in tree.body:
+        start, end = _node_start(node), node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            spans.append((node.name, start, end))
+        elif isinstance(node, ast.ClassDef):
+            source = "\n".join(lines[start - 1 : end])
+            methods = [item for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            if estimate_tokens(source) <= max_tokens or not methods:
+                spans.append((node.name, start, end))
+                continue
+            # Oversized class: header (bases, docstring, class attributes) plus one span per method.
+            header_end = _node_start(methods[0]) - 1
+            spans.append((node.name, start, max(start, header_end)))
+            for method in methods:
+                spans.append((f"{node.name}.{method.name}", _node_start(method), method.end_lineno))
+        else:
+            spans.append(("module", start, end))
+    return spans
+
+
+def _line_spans(lines: list[str], name: str, start: int, end: int, max_tokens: int) -> list[tuple[str, int, int]]:
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    spans = []
+    part_start, size = start, 0
+    for lineno in range(start, end + 1):
+        size += len(lines[lineno - 1]) + 1
+        if size > max_chars and lineno > part_start:
+            spans.append((name, part_start, lineno - 1))
+            part_start, size = lineno, len(lines[lineno - 1]) + 1
+    spans.append((name, part_start, end))
+    if len(spans) > 1:
+        spans = [(f"{span_name} (part {index + 1})", s, e) for index, (span_name, s, e) in enumerate(spans)]
+    return spans
+
+
+def split_into_chunks(content: str, max_tokens: int) -> list[dict]:
+    lines = content.splitlines()
+    if not lines:
+        return []
+
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        spans = _line_spans(lines, "lines", 1, len(lines), max_tokens)
+    else:
+        spans = []
+        for name, start, end in _symbol_spans(tree, lines, max_tokens):
+            spans.extend(_line_spans(lines, name, start, end, max_tokens))
+
+    # Pack neighbouring small symbols together so tiny helpers do not each cost a request.
+    chunks = []
+    for name, start, end in spans:
+        source = "\n".join(lines[start - 1 : end])
+        if not source.strip():
+            continue
+
+        if estimate_tokens(source) > max_tokens:
+            # A single line over budget (minified data, a huge string literal): slice it by characters.
+            max_chars = max_tokens * _CHARS_PER_TOKEN
+            pieces = [source[offset : offset + max_chars] for offset in range(0, len(source), max_chars)]
+            for index, piece in enumerate(pieces):
+                chunks.append({"names": [f"{name} (slice {index + 1})"], "start": start, "end": end, "source": piece})
+            continue
+
+        last = chunks[-1] if chunks else None
+        if last and estimate_tokens(last["source"] + "\n\n" + source) <= max_tokens:
+            if name not in last["names"]:
+                last["names"].append(name)
+            last["end"] = end
+            last["source"] = f"{last['source']}\n\n{source}"
+        else:
+            chunks.append({"names": [name], "start": start, "end": end, "source": source})
+
+    for chunk in chunks:
+        chunk["name"] = ", ".join(chunk.pop("names"))
+    return chunks
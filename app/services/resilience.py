@@ -0,0 +1,191 @@
+import threading
+import time
+import requests
+
+from app.config import Config
+
+
+class UpstreamUnavailable(requests.RequestException):
+    # Subclasses RequestException so existing network-error handling in the services
+    # treats a fast-failed call like any other failed request.
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} unavailable; retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, upstream: str, rate: float, capacity: float):
+        self.upstream = upstream
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def paused_for(self) -> float:
+        with self.lock:
+            return max(self.paused_until - time.monotonic(), 0.0)
+
+    def acquire(self) -> None:
+        # Short waits are absorbed here; a pause longer than RATE_LIMIT_MAX_WAIT_SECONDS
+        # (e.g. an exhausted hourly quota) fails fast so the job can be re-queued instead.
+        if self.max_rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if self.paused_until - now > Config.RATE_LIMIT_MAX_WAIT_SECONDS:
+                    raise UpstreamUnavailable(self.upstream, self.paused_until - now)
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(max(wait, 0.01))
+
+    def adapt(self, response: requests.Response) -> None:
+        # Follow what the upstream tells us: Retry-After pauses the bucket, GitHub-style
+        # X-RateLimit-* headers spread the remaining quota over the reset window, and a
+        # bare 429 halves the rate (additive recovery on every success).
+        if self.max_rate <= 0:
+            return
+        headers = response.headers
+        now = time.monotonic()
+        with self.lock:
+            retry_after = headers.get("Retry-After", "")
+            if response.status_code in (429, 503) and retry_after.isdigit():
+                self.paused_until = max(self.paused_until, now + float(retry_after))
+                self.tokens = 0
+
+            remaining = headers.get("X-RateLimit-Remaining", "")
+            reset = headers.get("X-RateLimit-Reset", "")
+            limit = headers.get("X-RateLimit-Limit", "")
+            if remaining.isdigit() and reset.isdigit():
+                window = max(float(reset) - time.time(), 1.0)
+                if int(remaining) == 0:
+                    self.paused_until = max(self.paused_until, now + window)
+                    self.tokens = 0
+                elif limit.isdigit() and int(remaining) > int(limit) * 0.1:
+                    self.rate = self.max_rate
+                else:
+                    # Quota is running low: stretch what is left over the rest of the window.
+                    self.rate = min(self.max_rate, max(int(remaining) / window, 0.1))
+                return
+
+            if response.status_code == 429:
+                self.rate = max(self.rate / 2, 0.1)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+
+class CircuitBreaker:
+    def __init__(self, upstream: str, failure_threshold: int, cooldown: float):
+        self.upstream = upstream
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        with self.lock:
+            if self.state == "closed":
+                return 0.0
+            return max(self.cooldown - (time.monotonic() - self.opened_at), 0.0)
+
+    def is_open(self) -> bool:
+        with self.lock:
+            return self.state != "closed"
+
+    def before_request(self) -> None:
+        with self.lock:
+            if self.state == "closed":
+                return
+            elapsed = time.monotonic() - self.opened_at
+            # After the cooldown one trial request is let through (half-open); its outcome
+            # closes the circuit or opens it for another cooldown.
+            if elapsed >= self.cooldown and not self.trial_in_flight:
+                self.state = "half_open"
+                self.trial_in_flight = True
+                return
+            retry_after = max(self.cooldown - elapsed, 1.0)
+        raise UpstreamUnavailable(self.upstream, retry_after)
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.state != "closed":
+                print(f"[resilience] upstream={self.upstream} circuit=closed")
+            self.state = "closed"
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"[resilience] upstream={self.upstream} circuit=open cooldown={self.cooldown:.0f}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+_limiters: dict[str, TokenBucket] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def _rate(upstream: str) -> float:
+    rates = {
+        "github": Config.GITHUB_RATE_PER_SECOND,
+        "deepseek": Config.DEEPSEEK_RATE_PER_SECOND,
+        "confluence": Config.CONFLUENCE_RATE_PER_SECOND,
+    }
+    return rates.get(upstream, 0.0)
+
+
+def limiter(upstream: str) -> TokenBucket:
+    with _registry_lock:
+        bucket = _limiters.get(upstream)
+        if bucket is None:
+            rate = _rate(upstream)
+            bucket = TokenBucket(upstream, rate=rate, capacity=max(rate, 1.0))
+            _limiters[upstream] = bucket
+        return bucket
+
+
+def breaker(upstream: str) -> CircuitBreaker:
+    with _registry_lock:
+        circuit = _breakers.get(upstream)
+        if circuit is None:
+            circuit = CircuitBreaker(
+                upstream,
+                failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+                cooldown=Config.CIRCUIT_COOLDOWN_SECONDS,
+            )
+            _breakers[upstream] = circuit
+        return circuit
+
+
+def is_failure(response: requests.Response) -> bool:
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def raise_if_unavailable(upstream: str) -> None:
+    # Called after a failed call: if the upstream is known to be down or out of quota,
+    # abort the job so the queue retries it once the upstream is expected back.
+    circuit = breaker(upstream)
+    paused_for = limiter(upstream).paused_for()
+    if circuit.is_open():
+        raise UpstreamUnavailable(upstream, max(circuit.retry_after(), paused_for, 1.0))
+    if paused_for > Config.RATE_LIMIT_MAX_WAIT_SECONDS:
+        raise UpstreamUnavailable(upstream, paused_for)
@@ -0,0 +1,24 @@
+import bisect
+import functools
+import hashlib
+
+from app.config import Config
+
+
+def _point(key: str) -> int:
+    # Stable across processes and restarts, unlike the salted built-in hash().
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+@functools.lru_cache(maxsize=8)
+def _ring(shards: int, vnodes: int) -> tuple[list[int], list[int]]:
+    nodes = sorted((_point(f"shard-{shard}#{vnode}"), shard) for shard in range(shards) for vnode in range(vnodes))
+    return [point for point, _shard in nodes], [shard for _node, shard in nodes]
+
+
+def shard_for(key: str, shards: int) -> int:
+    # Consistent hashing: changing the shard count only moves about 1/shards of the keys.
+    if shards <= 1:
+        return 0
+    points, owners = _ring(shards, max(1, Config.WORKER_SHARD_VNODES))
+    return owners[bisect.bisect(points, _point(key)) % len(points)]
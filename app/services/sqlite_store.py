@@ -0,0 +1,26 @@
+import os
+import sqlite3
+import threading
+
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def connect(path: str, schema: str) -> sqlite3.Connection:
+    # Autocommit connection (writes that must be atomic open BEGIN IMMEDIATE explicitly).
+    # The first open of a path switches it to WAL and creates the schema.
+    if path not in _schema_ready:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if path not in _schema_ready:
+        # Worker threads open their first connection at the same time; set up once.
+        with _schema_lock:
+            if path not in _schema_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(schema)
+                _schema_ready.add(path)
+    return conn
@@ -0,0 +1,104 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+from app.config import Config
+from app.services import sqlite_store
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    cache_key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used);
+"""
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+
+def _enabled() -> bool:
+    return bool(Config.SUMMARY_CACHE_PATH)
+
+
+def _connect() -> sqlite3.Connection:
+    return sqlite_store.connect(Config.SUMMARY_CACHE_PATH, _SCHEMA)
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _lock:
+        _stats[name] += amount
+
+
+def make_key(content: str, model: str, prompt_version: str) -> str:
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return f"{prompt_version}:{model}:{content_hash}"
+
+
+def get_summary(cache_key: str) -> str | None:
+    if not _enabled():
+        return None
+
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT summary FROM summaries WHERE cache_key = ? AND created_at >= ?",
+                (cache_key, now - Config.SUMMARY_CACHE_TTL_SECONDS),
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE summaries SET last_used = ? WHERE cache_key = ?", (now, cache_key))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        row = None
+
+    _count("hits" if row else "misses")
+    return row[0] if row else None
+
+
+def put_summary(cache_key: str, summary: str) -> None:
+    if not _enabled():
+        return
+
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (cache_key, summary, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (cache_key, summary, now, now),
+            )
+            evicted = conn.execute(
+                "DELETE FROM summaries WHERE created_at < ?",
+                (now - Config.SUMMARY_CACHE_TTL_SECONDS,),
+            ).rowcount
+            total = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+            if total > Config.SUMMARY_CACHE_MAX_ENTRIES:
+                # Size bound: drop the least recently used entries.
+                evicted += conn.execute(
+                    "DELETE FROM summaries WHERE cache_key IN "
+                    "(SELECT cache_key FROM summaries ORDER BY last_used LIMIT ?)",
+                    (total - Config.SUMMARY_CACHE_MAX_ENTRIES,),
+                ).rowcount
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return
+
+    _count("writes")
+    _count("evictions", evicted)
+
+
+def cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["enabled"] = _enabled()
+    return stats
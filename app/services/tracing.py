@@ -0,0 +1,237 @@
+import cProfile
+import contextvars
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+from app.config import Config
+
+
+# One trace per job attempt, keyed by the GitHub delivery ID. Spans and events are written as
+# JSON lines as they finish; nothing is buffered per trace, so a stuck job still shows progress.
+_current: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_output_lock = threading.Lock()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = [0]
+
+
+class _Trace:
+    def __init__(self, delivery_id: str, profile: bool):
+        self.delivery_id = delivery_id
+        self.profile = profile
+        self.profiles: list[cProfile.Profile] = []
+        self.lock = threading.Lock()
+
+
+class _Span:
+    def __init__(self, trace: _Trace, name: str, parent_id: str | None, attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+
+def enabled() -> bool:
+    return bool(Config.TRACE_OUTPUT)
+
+
+def _write(record: dict) -> None:
+    line = json.dumps(record, default=str)
+    target = Config.TRACE_OUTPUT
+    with _output_lock:
+        if target == "stdout":
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+            return
+        try:
+            directory = os.path.dirname(target)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(target, "a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+        except OSError:
+            return
+
+
+def _emit(kind: str, trace: _Trace, name: str, **fields) -> None:
+    _write({"ts": round(time.time(), 6), "kind": kind, "delivery_id": trace.delivery_id, "name": name, **fields})
+
+
+def current_span() -> _Span | None:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    # No-op outside a trace (or with tracing off) so callers can instrument unconditionally.
+    parent = _current.get()
+    if parent is None or not enabled():
+        yield None
+        return
+
+    current = _Span(parent.trace, name, parent.span_id, attrs)
+    token = _current.set(current)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as exc:
+        error = f"{exc.__class__.__name__}: {exc}"[:500]
+        raise
+    finally:
+        _current.reset(token)
+        fields = {"span_id": current.span_id, "parent_id": current.parent_id}
+        fields["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        if error:
+            fields["error"] = error
+        _emit("span", current.trace, name, **fields, **current.attrs)
+
+
+def annotate(**attrs) -> None:
+    current = _current.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def event(name: str, **attrs) -> None:
+    current = _current.get()
+    if current is None or not enabled():
+        return
+    _emit("event", current.trace, name, span_id=current.span_id, **attrs)
+
+
+def _start_tracemalloc() -> None:
+    with _tracemalloc_lock:
+        if _tracemalloc_users[0] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+        _tracemalloc_users[0] += 1
+
+
+def _stop_tracemalloc() -> None:
+    with _tracemalloc_lock:
+        _tracemalloc_users[0] -= 1
+        if _tracemalloc_users[0] == 0:
+            tracemalloc.stop()
+
+
+def _profile_report(trace: _Trace, snapshot_before, start_fields: dict) -> dict:
+    report = {}
+    with trace.lock:
+        profiles = list(trace.profiles)
+    if profiles:
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        directory = Config.TRACE_PROFILE_DIR
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{trace.delivery_id}-{int(time.time())}.prof")
+            stats.dump_stats(path)
+            report["profile_path"] = path
+        except OSError:
+            pass
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:15]
+        report["profile_top_cumulative"] = [
+            {"function": f"{filename}:{line}:{function}", "calls": calls, "cumulative_s": round(cumulative, 4)}
+            for (filename, line, function), (_primitive, calls, _total, cumulative, _callers) in top
+        ]
+
+    if snapshot_before is not None:
+        # tracemalloc is process-wide: with several jobs in flight the numbers include theirs.
+        _current_bytes, peak = tracemalloc.get_traced_memory()
+        snapshot_after = tracemalloc.take_snapshot()
+        growth = snapshot_after.compare_to(snapshot_before, "lineno")[:10]
+        report["memory_peak_bytes"] = peak
+        report["memory_top_growth"] = [
+            {"location": str(stat.traceback), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in growth
+        ]
+    return {**start_fields, **report}
+
+
+@contextmanager
+def trace(delivery_id: str, **attrs):
+    # Root span for one job attempt. With TRACE_PROFILE on, every thread that works for the
+    # job (see bind()) runs under its own cProfile profiler and the stats are merged at the end.
+    if not enabled():
+        yield None
+        return
+
+    current_trace = _Trace(delivery_id, profile=Config.TRACE_PROFILE)
+    snapshot_before = None
+    if current_trace.profile:
+        _start_tracemalloc()
+        snapshot_before = tracemalloc.take_snapshot()
+
+    root = _Span(current_trace, "job", None, attrs)
+    token = _current.set(root)
+    start = time.perf_counter()
+    error = None
+    try:
+        with _profiled(current_trace):
+            yield root
+    except BaseException as exc:
+        error = f"{exc.__class__.__name__}: {exc}"[:500]
+        raise
+    finally:
+        _current.reset(token)
+        fields = {"span_id": root.span_id, "parent_id": None}
+        fields["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        if error:
+            fields["error"] = error
+        if current_trace.profile:
+            fields = _profile_report(current_trace, snapshot_before, fields)
+            _stop_tracemalloc()
+        _emit("span", current_trace, "job", **fields, **root.attrs)
+
+
+@contextmanager
+def _profiled(current_trace: _Trace):
+    if not current_trace.profile:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler already owns this thread.
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with current_trace.lock:
+            current_trace.profiles.append(profiler)
+
+
+def bind(func):
+    # Pool threads do not inherit context variables; bind() carries the caller's span into
+    # them so work submitted to an executor stays inside the job's trace.
+    parent = _current.get()
+    if parent is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            with _profiled(parent.trace):
+                return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return wrapper
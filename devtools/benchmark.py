@@ -0,0 +1,360 @@
+"""Drive synthetic pushes through POST /webhook/github against local GitHub, DeepSeek and Confluence stubs."""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from devtools import confluence_stub, deepseek_stub, github_stub
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEBHOOK_SECRET = "benchmark-secret"
+TERMINAL_STATUSES = {"succeeded", "failed", "cancelled", "superseded"}
+
+# The service runs in its own process so its memory is measured apart from the stubs.
+_SERVE = (
+    "import sys\n"
+    "from run import app\n"
+    "app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True, debug=False, use_reloader=False)\n"
+)
+_STAGE_RE = re.compile(r'^autodoc_stage_duration_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _peak_rss_bytes(pid: int) -> int | None:
+    # Linux only: VmHWM is the peak resident set size of the process.
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def _shard_pids(supervisor_pid: int) -> list[int]:
+    # Linux only: the worker.py supervisor's spawned shard processes (not its resource tracker).
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii", errors="replace") as handle:
+                parent = int(handle.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as handle:
+                cmdline = handle.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == supervisor_pid and b"spawn_main" in cmdline:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def _mb(value: int | None) -> float | None:
+    return round(value / (1024 * 1024), 1) if value else None
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _push_payload(repo: str, index: int) -> dict:
+    history = github_stub.SyntheticHistory
+    return {
+        "ref": "refs/heads/main",
+        "before": history.commit_sha(index - 1),
+        "after": history.commit_sha(index),
+        "repository": {"name": repo, "full_name": f"bench/{repo}", "owner": {"name": "bench", "login": "bench"}},
+        "pusher": {"name": "benchmark"},
+        "compare": "",
+        "head_commit": {"message": f"synthetic commit {index}"},
+    }
+
+
+def _scrape(urls: list[str]) -> list[str]:
+    texts = []
+    for url in urls:
+        try:
+            texts.append(requests.get(url, timeout=10).text)
+        except requests.RequestException:
+            print(f"could not scrape {url}", file=sys.stderr)
+    return texts
+
+
+def _service_env(args: argparse.Namespace, workdir: str, ports: dict) -> dict:
+    env = dict(os.environ)
+    env.update(
+        {
+            "GITHUB_API_BASE": f"http://127.0.0.1:{ports['github']}",
+            "GITHUB_TOKEN": "benchmark",
+            "GITHUB_WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "ALLOW_UNSIGNED_WEBHOOKS": "false",
+            "DEEPSEEK_API_BASE": f"http://127.0.0.1:{ports['deepseek']}",
+            "DEEPSEEK_API_KEY": "benchmark",
+            "ENABLE_CONFLUENCE": "true",
+            "CONFLUENCE_BASE_URL": f"http://127.0.0.1:{ports['confluence']}",
+            "CONFLUENCE_EMAIL": "benchmark@example.com",
+            "CONFLUENCE_API_TOKEN": "benchmark",
+            "CONFLUENCE_SPACE_KEY": "BENCH",
+            "CONFLUENCE_PARENT_PAGE_ID": "",
+            "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+            "JOB_QUEUE_MAX_PENDING": str(args.repos * args.pushes + 10),
+            "BLOB_CACHE_DIR": os.path.join(workdir, "blobs"),
+            "SUMMARY_CACHE_PATH": os.path.join(workdir, "summaries.sqlite3"),
+            "PAGE_STATE_PATH": os.path.join(workdir, "pages.sqlite3"),
+            "TRACE_OUTPUT": os.path.join(workdir, "trace.jsonl"),
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    if args.worker_processes:
+        env["EMBEDDED_WORKERS"] = "false"
+        env["WORKER_METRICS_HOST"] = "127.0.0.1"
+        env["WORKER_METRICS_PORT"] = str(ports["worker_metrics"])
+    for assignment in args.env:
+        key, _sep, value = assignment.partition("=")
+        env[key] = value
+    return env
+
+
+def _wait_until_healthy(base_url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("service exited during startup; see service.log")
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("service did not become healthy")
+
+
+def _send_pushes(args: argparse.Namespace, base_url: str) -> dict[str, dict]:
+    sent = {}
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    session = requests.Session()
+    for index in range(1, args.pushes + 1):
+        for repo_number in range(args.repos):
+            repo = f"repo-{repo_number:03d}"
+            body = json.dumps(_push_payload(repo, index)).encode("utf-8")
+            delivery_id = f"bench-{repo}-{index:05d}"
+            signature = hmac.new(WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+            started = time.time()
+            response = session.post(
+                f"{base_url}/webhook/github",
+                data=body,
+                headers={
+                    "Content-Type": "application/json",
+                    "X-GitHub-Event": "push",
+                    "X-GitHub-Delivery": delivery_id,
+                    "X-Hub-Signature-256": f"sha256={signature}",
+                },
+                timeout=30,
+            )
+            sent[delivery_id] = {
+                "sent_at": started,
+                "accept_ms": (time.time() - started) * 1000,
+                "http_status": response.status_code,
+            }
+            if interval:
+                time.sleep(interval)
+    return sent
+
+
+def _wait_for_jobs(base_url: str, sent: dict[str, dict], timeout: float) -> dict[str, dict]:
+    jobs = {}
+    pending = [delivery_id for delivery_id, info in sent.items() if info["http_status"] == 202]
+    deadline = time.monotonic() + timeout
+    session = requests.Session()
+    while pending and time.monotonic() < deadline:
+        still_pending = []
+        for delivery_id in pending:
+            response = session.get(f"{base_url}/jobs/{delivery_id}", timeout=10)
+            job = response.json() if response.status_code == 200 else {}
+            if job.get("status") in TERMINAL_STATUSES:
+                jobs[delivery_id] = job
+            else:
+                still_pending.append(delivery_id)
+        pending = still_pending
+        if pending:
+            time.sleep(0.25)
+    for delivery_id in pending:
+        jobs[delivery_id] = {"status": "timed_out"}
+    return jobs
+
+
+def _stage_means(metrics_texts: list[str]) -> dict[str, dict]:
+    # Worker shards each expose their own histograms; sums and counts add up across them.
+    stages = {}
+    for metrics_text in metrics_texts:
+        for kind, stage, value in _STAGE_RE.findall(metrics_text):
+            totals = stages.setdefault(stage, {})
+            totals[kind] = totals.get(kind, 0.0) + float(value)
+    return {
+        stage: {"count": int(values.get("count", 0)), "mean_ms": round(values["sum"] / values["count"] * 1000, 2)}
+        for stage, values in sorted(stages.items())
+        if values.get("count")
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    workdir = tempfile.mkdtemp(prefix="autodoc-bench-")
+    history = github_stub.SyntheticHistory(args.files, args.functions_per_file, args.changes_per_push)
+    github, github_options = github_stub.start_stub_server(
+        history=history, latency=args.github_latency, error_rate=args.github_error_rate
+    )
+    deepseek, deepseek_options = deepseek_stub.start_stub_server(
+        latency=args.deepseek_latency, token_delay=args.deepseek_token_delay, error_rate=args.deepseek_error_rate
+    )
+    confluence, confluence_options = confluence_stub.start_stub_server(
+        latency=args.confluence_latency, error_rate=args.confluence_error_rate
+    )
+    ports = {
+        "github": github.server_address[1],
+        "deepseek": deepseek.server_address[1],
+        "confluence": confluence.server_address[1],
+    }
+
+    if args.worker_processes:
+        ports["worker_metrics"] = _free_port()
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(workdir, "service.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-c", _SERVE, str(port)],
+            cwd=REPO_ROOT,
+            env=_service_env(args, workdir, ports),
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        workers = None
+        if args.worker_processes:
+            workers = subprocess.Popen(
+                [sys.executable, "worker.py", "--processes", str(args.worker_processes)],
+                cwd=REPO_ROOT,
+                env=_service_env(args, workdir, ports),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+    try:
+        _wait_until_healthy(base_url, process)
+        started = time.time()
+        sent = _send_pushes(args, base_url)
+        jobs = _wait_for_jobs(base_url, sent, args.timeout)
+        finished = time.time()
+        metrics_urls = [f"{base_url}/metrics"]
+        if workers is not None:
+            # Job-side figures live in the worker shards, one listener per shard.
+            first = ports["worker_metrics"]
+            metrics_urls = [f"http://127.0.0.1:{first + shard}/metrics" for shard in range(args.worker_processes)]
+        metrics_texts = _scrape(metrics_urls)
+        peak_rss = _peak_rss_bytes(process.pid)
+        shard_rss = []
+        if workers is not None:
+            # Jobs run in the shards, so their peaks are what the push load costs.
+            shard_rss = [_peak_rss_bytes(pid) for pid in _shard_pids(workers.pid)]
+    finally:
+        for child in (process, workers):
+            if child is None:
+                continue
+            child.terminate()
+            try:
+                child.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                child.kill()
+        for server in (github, deepseek, confluence):
+            server.shutdown()
+
+    statuses = {}
+    for job in jobs.values():
+        statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+    latencies = [
+        job["updated_at"] - sent[delivery_id]["sent_at"]
+        for delivery_id, job in jobs.items()
+        if job["status"] == "succeeded"
+    ]
+    accept_ms = [info["accept_ms"] for info in sent.values()]
+    # Superseded and cancelled pushes are covered by the newer job that absorbed them.
+    completed = sum(statuses.get(status, 0) for status in ("succeeded", "superseded", "cancelled"))
+    elapsed = max(finished - started, 1e-9)
+
+    report = {
+        "workdir": workdir,
+        "pushes_sent": len(sent),
+        "rejected": sum(1 for info in sent.values() if info["http_status"] != 202),
+        "job_statuses": statuses,
+        "elapsed_s": round(elapsed, 2),
+        "pushes_per_minute": round(completed / elapsed * 60, 1),
+        "webhook_accept_ms": {
+            "p50": round(statistics.median(accept_ms), 2) if accept_ms else None,
+            "p95": round(_percentile(accept_ms, 0.95), 2) if accept_ms else None,
+        },
+        "end_to_end_s": {
+            "p50": round(statistics.median(latencies), 3) if latencies else None,
+            "p95": round(_percentile(latencies, 0.95), 3) if latencies else None,
+            "max": round(max(latencies), 3) if latencies else None,
+        },
+        "outbound_calls": {
+            "github": dict(sorted(github_options.calls.items())),
+            "deepseek": deepseek_options.requests,
+            "deepseek_peak_concurrency": deepseek_options.peak_active,
+            "confluence": dict(sorted(confluence_options.calls.items())),
+        },
+        "confluence_request_bytes": dict(sorted(confluence_options.received_bytes.items())),
+        "service_peak_rss_mb": _mb(peak_rss),
+        "stages": _stage_means(metrics_texts),
+    }
+    if workers is not None:
+        report["worker_shard_peak_rss_mb"] = [_mb(value) for value in shard_rss]
+        report["worker_peak_rss_mb"] = _mb(sum(value or 0 for value in shard_rss))
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repos", type=int, default=4)
+    parser.add_argument("--pushes", type=int, default=5, help="pushes per repository")
+    parser.add_argument("--rate", type=float, default=0.0, help="pushes per second to send (0 = no pacing)")
+    parser.add_argument("--files", type=int, default=50, help="python files per repository")
+    parser.add_argument("--functions-per-file", type=int, default=8)
+    parser.add_argument("--changes-per-push", type=int, default=3)
+    parser.add_argument("--github-latency", type=float, default=0.02)
+    parser.add_argument("--github-error-rate", type=float, default=0.0)
+    parser.add_argument("--deepseek-latency", type=float, default=0.2)
+    parser.add_argument("--deepseek-token-delay", type=float, default=0.0)
+    parser.add_argument("--deepseek-error-rate", type=float, default=0.0)
+    parser.add_argument("--confluence-latency", type=float, default=0.05)
+    parser.add_argument("--confluence-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--worker-processes", type=int, default=0, help="run jobs in worker.py processes (0 = inside the service)"
+    )
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for jobs to finish")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra service setting")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Local stand-in for the Confluence content REST API (search, list, create, update, delete, attachments)."""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+_CONTENT_RE = re.compile(r"^/rest/api/content(?:/(?P<page_id>\d+)(?P<child>/child/(?:page|attachment))?)?/?$")
+_FILENAME_RE = re.compile(rb'name="file"; filename="([^"]*)"')
+
+
+class ConfluenceStubOptions:
+    def __init__(self, latency: float = 0.0, status: int = 200, error_rate: float = 0.0):
+        self.latency = latency
+        self.status = status
+        self.error_rate = error_rate
+        self.requests = 0
+        self.calls: dict[str, int] = {}
+        self.received_bytes: dict[str, int] = {}
+        self.pages: dict[str, dict] = {}
+        self.next_id = 1000
+        self.lock = threading.Lock()
+
+
+def _summary(page: dict) -> dict:
+    return {
+        "id": page["id"],
+        "type": "page",
+        "title": page["title"],
+        "space": {"key": page["space"]},
+        "version": {"number": page["version"]},
+    }
+
+
+class ConfluenceStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options: ConfluenceStubOptions = ConfluenceStubOptions()
+
+    def log_message(self, format, *args):
+        return
+
+    def handle(self):
+        # Clients dropping keep-alive connections (e.g. the service shutting down) are expected.
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def _send_json(self, status: int, body: dict | None) -> None:
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", "0")))
+
+    def _read_json(self) -> dict:
+        try:
+            return json.loads(self._read_body() or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def _begin(self, kind: str) -> bool:
+        # Counts the call and its request body size, applies latency and decides whether to
+        # inject a failure.
+        options = self.options
+        with options.lock:
+            options.requests += 1
+            request_number = options.requests
+            options.calls[kind] = options.calls.get(kind, 0) + 1
+            size = int(self.headers.get("Content-Length", "0"))
+            options.received_bytes[kind] = options.received_bytes.get(kind, 0) + size
+        time.sleep(options.latency)
+        failing = options.error_rate and (request_number * options.error_rate) % 1 < options.error_rate
+        if options.status != 200 or failing:
+            self._send_json(options.status if options.status != 200 else 503, {"message": "stub failure"})
+            return False
+        return True
+
+    def _list(self, pages: list[dict], query: dict) -> dict:
+        start = int(query.get("start", ["0"])[0])
+        limit = int(query.get("limit", ["25"])[0])
+        window = pages[start : start + limit]
+        body = {"results": [_summary(page) for page in window], "start": start, "limit": limit, "size": len(window)}
+        if start + limit < len(pages):
+            body["_links"] = {"next": f"/rest/api/content?start={start + limit}&limit={limit}"}
+        return body
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        match = _CONTENT_RE.match(url.path)
+        if not match:
+            self._send_json(404, {"message": "not found"})
+            return
+        page_id, child = match.group("page_id"), match.group("child")
+        if child == "/child/attachment":
+            kind = "list_attachments"
+        else:
+            kind = "list_children" if child else "get" if page_id else "search" if "title" in query else "list"
+        if not self._begin(kind):
+            return
+
+        options = self.options
+        with options.lock:
+            pages = sorted(options.pages.values(), key=lambda page: int(page["id"]))
+            if kind == "list_attachments":
+                page = options.pages.get(page_id)
+                attachments = list(page["attachments"].values()) if page else []
+                self._send_json(200 if page else 404, {"results": attachments, "size": len(attachments)})
+            elif child:
+                self._send_json(200, self._list([page for page in pages if page["parent"] == page_id], query))
+            elif page_id:
+                page = options.pages.get(page_id)
+                if page:
+                    self._send_json(200, _summary(page))
+                else:
+                    self._send_json(404, {"message": "not found"})
+            elif "title" in query:
+                title = query["title"][0]
+                self._send_json(200, {"results": [_summary(page) for page in pages if page["title"] == title]})
+            else:
+                space = query.get("spaceKey", [""])[0]
+                self._send_json(200, self._list([page for page in pages if page["space"] == space], query))
+
+    def _attach(self, page_id: str) -> None:
+        # Multipart upload; the stub keeps the file name, size and version, not the bytes.
+        body = self._read_body()
+        match = _FILENAME_RE.search(body)
+        filename = match.group(1).decode("utf-8") if match else "file"
+        with self.options.lock:
+            page = self.options.pages.get(page_id)
+            if page is None:
+                self._send_json(404, {"message": "not found"})
+                return
+            previous = page["attachments"].get(filename, {})
+            attachment = {"title": filename, "bytes": len(body), "version": previous.get("version", 0) + 1}
+            page["attachments"][filename] = attachment
+        self._send_json(200, {"results": [{"id": f"att{page_id}-{filename}", **attachment}]})
+
+    def do_POST(self):
+        match = _CONTENT_RE.match(urlsplit(self.path).path)
+        if match and match.group("child") == "/child/attachment":
+            if self._begin("attach"):
+                self._attach(match.group("page_id"))
+            return
+        if not match or not self._begin("create"):
+            return
+        payload = self._read_json()
+        options = self.options
+        with options.lock:
+            title = payload.get("title", "")
+            if any(page["title"] == title for page in options.pages.values()):
+                self._send_json(400, {"message": "A page with this title already exists"})
+                return
+            options.next_id += 1
+            page = {
+                "id": str(options.next_id),
+                "title": title,
+                "space": payload.get("space", {}).get("key", ""),
+                "parent": (payload.get("ancestors") or [{}])[0].get("id"),
+                "version": 1,
+                "body": payload.get("body", {}).get("storage", {}).get("value", ""),
+                "attachments": {},
+            }
+            options.pages[page["id"]] = page
+            self._send_json(200, _summary(page))
+
+    def do_PUT(self):
+        match = _CONTENT_RE.match(urlsplit(self.path).path)
+        if match and match.group("child") == "/child/attachment":
+            if self._begin("attach"):
+                self._attach(match.group("page_id"))
+            return
+        if not match or not match.group("page_id") or not self._begin("update"):
+            return
+        payload = self._read_json()
+        options = self.options
+        with options.lock:
+            page = options.pages.get(match.group("page_id"))
+            if page is None:
+                self._send_json(404, {"message": "not found"})
+                return
+            version = payload.get("version", {}).get("number")
+            if version != page["version"] + 1:
+                self._send_json(409, {"message": f"version conflict: current is {page['version']}"})
+                return
+            page.update(
+                title=payload.get("title", page["title"]),
+                version=version,
+                body=payload.get("body", {}).get("storage", {}).get("value", ""),
+            )
+            self._send_json(200, _summary(page))
+
+    def do_DELETE(self):
+        match = _CONTENT_RE.match(urlsplit(self.path).path)
+        if not match or not match.group("page_id") or not self._begin("delete"):
+            return
+        with self.options.lock:
+            page = self.options.pages.pop(match.group("page_id"), None)
+        if page:
+            self._send_json(204, None)
+        else:
+            self._send_json(404, {"message": "not found"})
+
+
+def start_stub_server(
+    host: str = "127.0.0.1", port: int = 0, **options
+) -> tuple[ThreadingHTTPServer, ConfluenceStubOptions]:
+    stub_options = ConfluenceStubOptions(**options)
+    handler = type("ConfiguredConfluenceStubHandler", (ConfluenceStubHandler,), {"options": stub_options})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub_options
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--status", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, _options = start_stub_server(
+        host=args.host, port=args.port, latency=args.latency, status=args.status, error_rate=args.error_rate
+    )
+    print(f"Confluence stub listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
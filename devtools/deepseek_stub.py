@@ -0,0 +1,214 @@
+"""Local stand-in for the DeepSeek chat completions API (blocking and streamed)."""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_SUMMARY = (
+    "<h3>Purpose</h3><p>Stub summary generated locally.</p>"
+    "<h3>High-Level Flow</h3><ul><li>Reads input.</li><li>Returns output.</li></ul>"
+    "<h3>Functions and Return Values</h3><table><thead><tr><th>Function</th><th>Inputs</th>"
+    "<th>Return Value</th><th>Notes</th></tr></thead><tbody><tr><td><code>main</code></td>"
+    "<td>none</td><td>None</td><td>Entry point.</td></tr></tbody></table>"
+    "<h3>Input/Output Behavior</h3><p>No I/O.</p>"
+    "<h3>Error Handling and Edge Cases</h3><p>None.</p>"
+    "<h3>Recent Change Summary</h3><p>Stub change.</p>"
+    "<h3>Risks / Follow-ups</h3><p>None.</p>"
+)
+
+
+class StubOptions:
+    def __init__(
+        self,
+        content: str = DEFAULT_SUMMARY,
+        first_token_delay: float = 0.0,
+        token_delay: float = 0.0,
+        latency: float = 0.0,
+        stall_after: int | None = None,
+        status: int = 200,
+        error_rate: float = 0.0,
+    ):
+        self.content = content
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.latency = latency
+        self.stall_after = stall_after
+        self.status = status
+        self.error_rate = error_rate
+        self.requests = 0
+        self.active = 0
+        self.peak_active = 0
+        self.lock = threading.Lock()
+
+
+_BATCH_FILE_RE = re.compile(r"<!-- FILE: (.+?) -->\nChange Type:")
+_CHANGED_SYMBOLS_RE = re.compile(r"^Changed symbols: (.*)$", re.MULTILINE)
+
+
+def _reply_for(prompt: str, content: str) -> str:
+    # Answer in the shape each prompt asks for, so batch and incremental paths are exercised
+    # instead of falling back to single-file requests.
+    paths = _BATCH_FILE_RE.findall(prompt)
+    if paths:
+        return "".join(f"<!-- FILE: {path} -->\n{content}\n<!-- END FILE -->\n" for path in paths)
+
+    symbols = _CHANGED_SYMBOLS_RE.search(prompt)
+    if "<!-- SECTION: rows -->" in prompt and symbols:
+        names = [name.strip() for name in symbols.group(1).split(",") if name.strip() and name.strip() != "none"]
+        rows = "".join(
+            f"<tr><td><code>{name}</code></td><td>payload</td><td>value</td><td>Revised.</td></tr>" for name in names
+        )
+        return (
+            f"<!-- SECTION: rows -->\n{rows}\n"
+            "<!-- SECTION: recent-change-summary -->\n<p>Stub revision.</p>\n"
+            "<!-- SECTION: risks -->\n<p>None.</p>\n"
+        )
+    return content
+
+
+def _tokens(content: str, size: int = 8) -> list[str]:
+    return [content[index : index + size] for index in range(0, len(content), size)]
+
+
+class DeepSeekStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options: StubOptions = StubOptions()
+
+    def log_message(self, format, *args):
+        return
+
+    def handle(self):
+        # Clients dropping keep-alive connections (e.g. the service shutting down) are expected.
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        options = self.options
+        with options.lock:
+            options.requests += 1
+            request_number = options.requests
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        failing = options.error_rate and (request_number * options.error_rate) % 1 < options.error_rate
+        if options.status != 200 or failing:
+            self._send_json(options.status if options.status != 200 else 500, {"error": "stub failure"})
+            return
+
+        # Generations in progress at once, streamed or not; shows whether client-side caps hold.
+        with options.lock:
+            options.active += 1
+            options.peak_active = max(options.peak_active, options.active)
+        try:
+            self._complete(request)
+        finally:
+            with options.lock:
+                options.active -= 1
+
+    def _complete(self, request: dict) -> None:
+        options = self.options
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        reply = _reply_for(prompt, options.content)
+        tokens = _tokens(reply)
+        usage = {
+            "prompt_tokens": len(prompt) // 4 + 1,
+            "completion_tokens": len(tokens),
+            "total_tokens": len(prompt) // 4 + 1 + len(tokens),
+        }
+
+        if not request.get("stream"):
+            time.sleep(options.latency + options.first_token_delay + options.token_delay * len(tokens))
+            self._send_json(
+                200,
+                {
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}}],
+                    "usage": usage,
+                },
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(options.latency + options.first_token_delay)
+        try:
+            for index, token in enumerate(tokens):
+                if options.stall_after is not None and index >= options.stall_after:
+                    # Simulate a generation that hangs mid-stream.
+                    time.sleep(3600)
+                event = {"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(event)}\n\n")
+                time.sleep(options.token_delay)
+
+            final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            self._write_chunk(f"data: {json.dumps(final)}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, **options) -> tuple[ThreadingHTTPServer, StubOptions]:
+    stub_options = StubOptions(**options)
+    handler = type("ConfiguredDeepSeekStubHandler", (DeepSeekStubHandler,), {"options": stub_options})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub_options
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--stall-after", type=int, default=None)
+    parser.add_argument("--status", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, _options = start_stub_server(
+        host=args.host,
+        port=args.port,
+        first_token_delay=args.first_token_delay,
+        token_delay=args.token_delay,
+        latency=args.latency,
+        stall_after=args.stall_after,
+        status=args.status,
+        error_rate=args.error_rate,
+    )
+    print(f"DeepSeek stub listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
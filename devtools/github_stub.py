@@ -0,0 +1,248 @@
+"""Local stand-in for the GitHub REST endpoints the diff service reads (compare, trees, blobs, contents)."""
+
+import argparse
+import base64
+import difflib
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+COMPARE_FILE_LIMIT = 300
+
+_ROUTE_RE = re.compile(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/(?P<rest>.+)$")
+
+
+class SyntheticHistory:
+    # Every repository follows the same deterministic history: commit k (k >= 1) modifies
+    # changes_per_push files, round-robin. Commit SHAs encode k, so any process can serve them.
+    # Paths and contents include the repository name so pages and caches never collide.
+    def __init__(self, files: int = 50, functions_per_file: int = 8, changes_per_push: int = 3):
+        self.files = files
+        self.functions_per_file = functions_per_file
+        self.changes_per_push = changes_per_push
+
+    @staticmethod
+    def commit_sha(index: int) -> str:
+        return f"{index + 1:040x}"
+
+    @staticmethod
+    def commit_index(sha: str) -> int | None:
+        try:
+            index = int(sha, 16) - 1
+        except ValueError:
+            return None
+        return index if index >= 0 else None
+
+    def path(self, repo: str, file_index: int) -> str:
+        prefix = re.sub(r"\W", "_", repo)
+        return f"pkg/mod{file_index % 10}/{prefix}_{file_index:05d}.py"
+
+    def changed_in(self, commit: int) -> set[int]:
+        if commit <= 0:
+            return set()
+        return {(commit * self.changes_per_push + offset) % self.files for offset in range(self.changes_per_push)}
+
+    @functools.lru_cache(maxsize=None)
+    def version(self, file_index: int, commit: int) -> int:
+        return sum(1 for index in range(1, commit + 1) if file_index in self.changed_in(index))
+
+    @functools.lru_cache(maxsize=4096)
+    def content(self, repo: str, file_index: int, version: int) -> str:
+        lines = [f'"""Synthetic module {file_index} of {repo}, revision {version}."""', "import os", ""]
+        for function in range(self.functions_per_file):
+            constant = version if function == version % self.functions_per_file else 0
+            lines += [
+                "",
+                f"def handler_{file_index}_{function}(payload):",
+                f'    """Handle field {function} of the payload."""',
+                f'    value = payload.get("field_{function}", {constant})',
+                f'    if os.getenv("SCALE_{function}"):',
+                f'        value *= int(os.getenv("SCALE_{function}"))',
+                f"    return value + {function}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def blob_sha(content: str) -> str:
+        data = content.encode("utf-8")
+        return hashlib.sha1(f"blob {len(data)}\0".encode("ascii") + data).hexdigest()
+
+
+class GitHubStubOptions:
+    def __init__(
+        self,
+        history: SyntheticHistory | None = None,
+        latency: float = 0.0,
+        status: int = 200,
+        error_rate: float = 0.0,
+    ):
+        self.history = history or SyntheticHistory()
+        self.latency = latency
+        self.status = status
+        self.error_rate = error_rate
+        self.requests = 0
+        self.calls: dict[str, int] = {}
+        self.blobs: dict[str, str] = {}
+        self.lock = threading.Lock()
+
+
+class GitHubStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options: GitHubStubOptions = GitHubStubOptions()
+
+    def log_message(self, format, *args):
+        return
+
+    def handle(self):
+        # Clients dropping keep-alive connections (e.g. the service shutting down) are expected.
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-RateLimit-Limit", "5000")
+        self.send_header("X-RateLimit-Remaining", "4999")
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _blob(self, repo: str, file_index: int, version: int) -> tuple[str, str]:
+        content = self.options.history.content(repo, file_index, version)
+        sha = self.options.history.blob_sha(content)
+        with self.options.lock:
+            self.options.blobs[sha] = content
+        return sha, content
+
+    def _compare(self, repo: str, base: int, head: int) -> dict:
+        history = self.options.history
+        files = []
+        for file_index in range(history.files):
+            old, new = history.version(file_index, base), history.version(file_index, head)
+            if old == new:
+                continue
+            before = history.content(repo, file_index, old).splitlines()
+            sha, after = self._blob(repo, file_index, new)
+            diff = list(difflib.unified_diff(before, after.splitlines(), lineterm="", n=3))[2:]
+            files.append(
+                {"filename": history.path(repo, file_index), "status": "modified", "sha": sha, "patch": "\n".join(diff)}
+            )
+        # GitHub silently truncates the compare file list.
+        return {"status": "ahead", "total_commits": head - base, "files": files[:COMPARE_FILE_LIMIT]}
+
+    def _tree(self, repo: str, commit: int) -> dict:
+        history = self.options.history
+        tree = []
+        for file_index in range(history.files):
+            sha, _content = self._blob(repo, file_index, history.version(file_index, commit))
+            tree.append({"path": history.path(repo, file_index), "type": "blob", "mode": "100644", "sha": sha})
+        return {"sha": history.commit_sha(commit), "tree": tree, "truncated": False}
+
+    def _route(self, repo: str, kind: str, rest: str, query: dict) -> tuple[int, dict]:
+        history = self.options.history
+        if kind == "compare":
+            base_sha, _sep, head_sha = rest.partition("...")
+            base, head = history.commit_index(base_sha), history.commit_index(head_sha)
+            if base is None or head is None:
+                return 404, {"message": "Not Found"}
+            return 200, self._compare(repo, base, head)
+
+        if kind == "trees":
+            commit = history.commit_index(rest)
+            if commit is None:
+                return 404, {"message": "Not Found"}
+            return 200, self._tree(repo, commit)
+
+        if kind == "blobs":
+            with self.options.lock:
+                content = self.options.blobs.get(rest)
+            if content is None:
+                return 404, {"message": "Not Found"}
+            encoded = base64.b64encode(content.encode("utf-8")).decode("ascii")
+            return 200, {"sha": rest, "encoding": "base64", "content": encoded, "size": len(content)}
+
+        if kind == "contents":
+            commit = history.commit_index(query.get("ref", [""])[0])
+            paths = {history.path(repo, index): index for index in range(history.files)}
+            if commit is None or rest not in paths:
+                return 404, {"message": "Not Found"}
+            sha, content = self._blob(repo, paths[rest], history.version(paths[rest], commit))
+            encoded = base64.b64encode(content.encode("utf-8")).decode("ascii")
+            return 200, {"path": rest, "sha": sha, "encoding": "base64", "content": encoded}
+
+        return 404, {"message": "Not Found"}
+
+    def do_GET(self):
+        options = self.options
+        url = urlsplit(self.path)
+        match = _ROUTE_RE.match(url.path)
+        rest = match.group("rest") if match else ""
+        kind, _sep, remainder = rest.partition("/")
+        if kind == "git":
+            kind, _sep, remainder = remainder.partition("/")
+        with options.lock:
+            options.requests += 1
+            request_number = options.requests
+            options.calls[kind or "other"] = options.calls.get(kind or "other", 0) + 1
+
+        time.sleep(options.latency)
+        failing = options.error_rate and (request_number * options.error_rate) % 1 < options.error_rate
+        if options.status != 200 or failing:
+            self._send_json(options.status if options.status != 200 else 502, {"message": "stub failure"})
+            return
+
+        repo = match.group("repo") if match else ""
+        status, body = self._route(repo, kind, unquote(remainder), parse_qs(url.query))
+        self._send_json(status, body)
+
+
+def start_stub_server(
+    host: str = "127.0.0.1", port: int = 0, **options
+) -> tuple[ThreadingHTTPServer, GitHubStubOptions]:
+    stub_options = GitHubStubOptions(**options)
+    handler = type("ConfiguredGitHubStubHandler", (GitHubStubHandler,), {"options": stub_options})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub_options
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--functions-per-file", type=int, default=8)
+    parser.add_argument("--changes-per-push", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--status", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, _options = start_stub_server(
+        host=args.host,
+        port=args.port,
+        history=SyntheticHistory(args.files, args.functions_per_file, args.changes_per_push),
+        latency=args.latency,
+        status=args.status,
+        error_rate=args.error_rate,
+    )
+    print(f"GitHub stub listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,4 +6,5 @@ app = create_app()
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=Config.PORT, debug=True)
+    # The reloader would import the app in a second process and start a second set of job workers.
+    app.run(host="0.0.0.0", port=Config.PORT, debug=True, use_reloader=False)
@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+
+from app.config import Config
+from app.services import deepseek_service, incremental_summary
+
+
+FULL_SUMMARY = (
+    "<h3>Purpose</h3><p>Adds numbers.</p>"
+    "<h3>Functions and Return Values</h3>"
+    "<table><tbody>"
+    "<tr><td><code>add</code></td><td>a, b</td><td>int</td><td>Adds.</td></tr>"
+    "<tr><td><code>sub</code></td><td>a, b</td><td>int</td><td>Subtracts.</td></tr>"
+    "</tbody></table>"
+    "<h3>Recent Change Summary</h3><p>Initial version.</p>"
+    "<h3>Risks / Follow-ups</h3><p>None.</p>"
+)
+
+REVISION = (
+    "<!-- SECTION: rows -->\n"
+    "<tr><td><code>add</code></td><td>a, b</td><td>float</td><td>Adds floats.</td></tr>\n"
+    "<!-- SECTION: recent-change-summary -->\n<p>add now returns floats.</p>\n"
+    "<!-- SECTION: risks -->\n<p>Callers expecting int.</p>\n"
+)
+
+CONTENT = "def add(a, b):\n    return float(a + b)\n\n\ndef sub(a, b):\n    return a - b\n" + "\n# padding\n" * 40
+PATCH = "@@ -1,2 +1,2 @@\n def add(a, b):\n-    return a + b\n+    return float(a + b)"
+
+
+class SpliceRevisionTest(unittest.TestCase):
+    def test_replaces_touched_row_and_revised_sections(self):
+        revision = incremental_summary.parse_revision(REVISION)
+        spliced = incremental_summary.splice_revision(FULL_SUMMARY, revision, removed=[])
+
+        self.assertIn("Adds floats.", spliced)
+        self.assertNotIn("<td>Adds.</td>", spliced)
+        self.assertIn("Subtracts.", spliced)
+        self.assertIn("add now returns floats.", spliced)
+        self.assertIn("Callers expecting int.", spliced)
+        self.assertNotIn("Initial version.", spliced)
+
+    def test_removed_symbols_drop_their_rows(self):
+        revision = incremental_summary.parse_revision(REVISION)
+        spliced = incremental_summary.splice_revision(FULL_SUMMARY, revision, removed=["sub"])
+        self.assertNotIn("Subtracts.", spliced)
+
+    def test_partial_summary_without_risks_section_is_rejected(self):
+        partial = FULL_SUMMARY[: FULL_SUMMARY.rfind("<h3>")]
+        revision = incremental_summary.parse_revision(REVISION)
+        self.assertIsNone(incremental_summary.splice_revision(partial, revision, removed=[]))
+
+
+class IncrementalFallbackTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            Config,
+            DEEPSEEK_API_KEY="test",
+            DEEPSEEK_INCREMENTAL=True,
+            DEEPSEEK_INCREMENTAL_MAX_RATIO=1.0,
+            SUMMARY_CACHE_PATH="",
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.file_change = {"path": "calc.py", "status": "modified", "content": CONTENT, "patch": PATCH}
+
+    def test_unspliceable_previous_summary_falls_back_to_full_generation(self):
+        partial = FULL_SUMMARY[: FULL_SUMMARY.rfind("<h3>")]
+        responses = [(REVISION, True), ("<h3>Purpose</h3><p>Fresh summary.</p>", True)]
+        with mock.patch.object(deepseek_service, "_chat_completion", side_effect=responses) as completion:
+            summary = deepseek_service.generate_script_summary(self.file_change, {}, previous_summary=partial)
+
+        self.assertEqual(summary, "<h3>Purpose</h3><p>Fresh summary.</p>")
+        self.assertEqual(completion.call_count, 2)
+
+    def test_cut_off_revision_is_marked_partial_and_not_cached(self):
+        with mock.patch.object(deepseek_service, "_chat_completion", return_value=(REVISION, False)), mock.patch.object(
+            deepseek_service.summary_cache, "put_summary"
+        ) as put_summary:
+            summary = deepseek_service.generate_script_summary(self.file_change, {}, previous_summary=FULL_SUMMARY)
+
+        self.assertIn("Adds floats.", summary)
+        self.assertTrue(summary.endswith(deepseek_service._PARTIAL_NOTE))
+        put_summary.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
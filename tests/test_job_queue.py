@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from app.config import Config
+from app.services import job_queue
+
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.multiple(
+            Config,
+            JOB_QUEUE_PATH=os.path.join(directory.name, "jobs.sqlite3"),
+            JOB_LEASE_SECONDS=3,
+            JOB_POLL_SECONDS=0.05,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _lease_expires(self, delivery_id):
+        conn = job_queue._connect()
+        try:
+            return conn.execute("SELECT lease_expires FROM jobs WHERE delivery_id = ?", (delivery_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_running_job_lease_is_renewed(self):
+        job_queue.enqueue("d1", {"repo_full_name": "o/r"})
+        job = job_queue._claim()
+        first = self._lease_expires("d1")
+
+        stopped = threading.Event()
+        heartbeat = threading.Thread(target=job_queue._heartbeat, args=(job["delivery_id"], stopped))
+        heartbeat.start()
+        time.sleep(1.5)
+        stopped.set()
+        heartbeat.join()
+
+        self.assertGreater(self._lease_expires("d1"), first)
+
+    def test_coalesced_job_keeps_the_oldest_place_in_line(self):
+        job_queue.enqueue("busy-1", {"repo_full_name": "o/busy", "before": "a", "after": "b"})
+        job_queue.enqueue("quiet", {"repo_full_name": "o/quiet", "before": "x", "after": "y"})
+        merged = job_queue.enqueue("busy-2", {"repo_full_name": "o/busy", "before": "b", "after": "c"})
+
+        self.assertEqual(merged["base"], "a")
+        self.assertEqual(merged["created_at"], job_queue.get_job("busy-1")["created_at"])
+        self.assertEqual(job_queue._claim()["delivery_id"], "busy-2")
+
+    def test_worker_survives_bookkeeping_errors(self):
+        job_queue.enqueue("d1", {"repo_full_name": "o/r"})
+        job_queue.enqueue("d2", {"repo_full_name": "o/other"})
+        claims = [job_queue._claim(), job_queue._claim()]
+        handled = []
+        finish = job_queue._finish
+
+        def flaky_finish(job, **kwargs):
+            if job["delivery_id"] == "d1":
+                raise sqlite3.OperationalError("database is locked")
+            finish(job, **kwargs)
+
+        # The loop ends when the claims run out; everything before that must be survived.
+        with mock.patch.object(job_queue, "_finish", side_effect=flaky_finish), mock.patch.object(
+            job_queue, "_claim", side_effect=claims
+        ), self.assertRaises(StopIteration):
+            job_queue._worker_loop(lambda context, cancelled: handled.append(context["repo_full_name"]), 0, 1)
+
+        self.assertEqual(handled, ["o/r", "o/other"])
+        self.assertEqual(job_queue.get_job("d1")["status"], "running")
+        self.assertEqual(job_queue.get_job("d2")["status"], "succeeded")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from app.services import prompt_builder
+
+
+class SplitIntoChunksTest(unittest.TestCase):
+    def test_over_budget_line_is_sliced_by_characters(self):
+        content = "BLOB = '" + "a" * 100_000 + "'\n\n\ndef f():\n    return 1\n"
+        chunks = prompt_builder.split_into_chunks(content, max_tokens=1000)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(prompt_builder.estimate_tokens(chunk["source"]), 1001)
+        self.assertTrue("".join(chunk["source"] for chunk in chunks).startswith(content.splitlines()[0]))
+        self.assertIn("def f()", chunks[-1]["source"])
+
+    def test_small_symbols_are_packed_together(self):
+        content = "def a():\n    return 1\n\n\ndef b():\n    return 2\n"
+        chunks = prompt_builder.split_into_chunks(content, max_tokens=1000)
+        self.assertEqual([chunk["name"] for chunk in chunks], ["a, b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
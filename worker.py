@@ -0,0 +1,95 @@
+import argparse
+import multiprocessing
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.config import Config
+from app.routes import metric_samples, process_push_event
+from app.services import job_queue, metrics
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    # Stage histograms, token usage, cache counters and breaker state live in each shard
+    # process, so every shard exposes them itself.
+    def log_message(self, format, *args):
+        return
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = metrics.render(metric_samples()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _serve_metrics(shard: int) -> None:
+    if Config.WORKER_METRICS_PORT <= 0:
+        return
+    port = Config.WORKER_METRICS_PORT + shard
+    server = ThreadingHTTPServer((Config.WORKER_METRICS_HOST, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"[worker] shard={shard} metrics on http://{Config.WORKER_METRICS_HOST}:{port}/metrics")
+
+
+def _run_shard(shard: int, shards: int) -> None:
+    # Runs in a fresh (spawned) interpreter; JOB_WORKERS threads serve this shard's repositories.
+    # Ctrl-C reaches the whole process group; shutdown is left to the supervisor.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    print(f"[worker] shard={shard}/{shards} started with {max(1, Config.JOB_WORKERS)} threads")
+    _serve_metrics(shard)
+    job_queue.start_workers(handler=process_push_event, shard=shard, shards=shards)
+    threading.Event().wait()
+
+
+def _start(context, shard: int, shards: int) -> multiprocessing.Process:
+    process = context.Process(target=_run_shard, args=(shard, shards), name=f"job-shard-{shard}")
+    process.start()
+    return process
+
+
+def _release(process: multiprocessing.Process) -> None:
+    released = job_queue.release_jobs(job_queue.worker_id(process.pid))
+    if released:
+        print(f"[worker] requeued {released} running job(s) of pid={process.pid}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run push processing in sharded worker processes.")
+    parser.add_argument("--processes", type=int, default=Config.WORKER_PROCESSES)
+    args = parser.parse_args()
+    shards = max(1, args.processes)
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: stopping.set())
+
+    context = multiprocessing.get_context("spawn")
+    processes = {shard: _start(context, shard, shards) for shard in range(shards)}
+    try:
+        # Supervise: a crashed shard is restarted and the jobs it held are handed back.
+        while not stopping.wait(1):
+            for shard, process in processes.items():
+                if not process.is_alive():
+                    print(f"[worker] shard={shard} exited with code {process.exitcode}; restarting")
+                    _release(process)
+                    processes[shard] = _start(context, shard, shards)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            _release(process)
+
+
+if __name__ == "__main__":
+    main()